@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+benchmark_redaction.py
+
+Benchmarks filter_datum and RedactingFormatter.format on synthetic log
+records and prints the results as JSON, so runs from different releases
+can be compared.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import re
+import string
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+
+def legacy_filter_datum(fields: List[str], redaction: str, message: str,
+                        separator: str) -> str:
+    """
+    Reference implementation running one re.sub per field, as
+    filter_datum did before the single-pass engine.
+    """
+    for field in fields:
+        message = re.sub(f'{field}=(.*?){separator}',
+                         f'{field}={redaction}{separator}', message)
+    return message
+
+
+class LegacyRedactingFormatter(RedactingFormatter):
+    """ RedactingFormatter running the per-field reference redaction """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """ Returns filtered values """
+        message = logging.Formatter.format(self, record)
+        return legacy_filter_datum(self.fields, self.REDACTION,
+                                   message, self.SEPARATOR)
+
+
+def make_messages(count: int, fields: int, value_length: int,
+                  pii_density: float, seed: int) -> List[str]:
+    """
+    Generates ``count`` "key=value;" messages of ``fields`` pairs each,
+    where each pair is a PII field with probability ``pii_density``.
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + "@.-"
+    others = [f"attr{i}" for i in range(fields)]
+    messages = []
+    for _ in range(count):
+        pairs = []
+        for i in range(fields):
+            if rng.random() < pii_density:
+                key = rng.choice(PII_FIELDS)
+            else:
+                key = others[i]
+            value = ''.join(rng.choice(alphabet)
+                            for _ in range(value_length))
+            pairs.append(f"{key}={value};")
+        messages.append(''.join(pairs))
+    return messages
+
+
+def make_records(messages: List[str]) -> List[logging.LogRecord]:
+    """ Wraps messages into INFO records of the "user_data" logger """
+    return [logging.makeLogRecord({"name": "user_data",
+                                   "levelno": logging.INFO,
+                                   "levelname": "INFO",
+                                   "msg": message})
+            for message in messages]
+
+
+def measure(func: Callable, items: List, repeat: int) -> Dict[str, float]:
+    """
+    Runs ``func`` over every item ``repeat`` times and returns the best
+    timing, plus the allocations of one extra traced pass.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for item in items:
+        func(item)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(max(stat.count_diff, 0) for stat in stats)
+
+    return {"ns_per_record": best / len(items),
+            "records_per_sec": len(items) * 1e9 / best,
+            "peak_bytes": peak,
+            "retained_blocks": blocks}
+
+
+def run(options: argparse.Namespace) -> Dict:
+    """ Runs every benchmark case and returns the JSON report """
+    messages = make_messages(options.records, options.fields,
+                             options.value_length, options.pii_density,
+                             options.seed)
+    records = make_records(messages)
+    fields = list(PII_FIELDS)
+    cases = {
+        "filter_datum.legacy": (lambda m: legacy_filter_datum(
+            fields, "***", m, ";"), messages),
+        "filter_datum.engine": (lambda m: filter_datum(
+            fields, "***", m, ";"), messages),
+        "formatter.legacy": (LegacyRedactingFormatter(fields).format,
+                             records),
+        "formatter.engine": (RedactingFormatter(fields).format, records),
+    }
+    results = {name: measure(func, items, options.repeat)
+               for name, (func, items) in cases.items()}
+    for kind in ("filter_datum", "formatter"):
+        legacy = results[f"{kind}.legacy"]["ns_per_record"]
+        engine = results[f"{kind}.engine"]["ns_per_record"]
+        results[f"{kind}.engine"]["speedup"] = legacy / engine
+
+    return {"python": platform.python_version(),
+            "parameters": {"records": options.records,
+                           "fields": options.fields,
+                           "value_length": options.value_length,
+                           "pii_density": options.pii_density,
+                           "repeat": options.repeat,
+                           "seed": options.seed},
+            "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--fields", type=int, default=8,
+                        help="key=value pairs per message")
+    parser.add_argument("--value-length", type=int, default=16,
+                        help="characters per value")
+    parser.add_argument("--pii-density", type=float, default=0.5,
+                        help="probability that a pair is a PII field")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None,
+                        help="write the JSON report here instead of stdout")
+    options = parser.parse_args()
+
+    report = run(options)
+    if options.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
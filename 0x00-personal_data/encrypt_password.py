@@ -6,8 +6,25 @@ Module for hashing passwords securely using bcrypt
 and validating hashed passwords.
 """
 
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
 import bcrypt
 
+DEFAULT_COST = 12
+MIN_COST = 4
+MAX_COST = 31
+
+_cost = DEFAULT_COST
+_executor = None
+_workers = 0
+_executor_lock = threading.Lock()
+
 
 def hash_password(password: str) -> bytes:
     """
@@ -19,7 +36,7 @@ def hash_password(password: str) -> bytes:
     Returns:
     - bytes: Salted, hashed password as a byte string.
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=_cost)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
 
     return hashed_password
@@ -37,3 +54,230 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     - bool: True if the password matches the hashed password, False otherwise.
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def get_cost() -> int:
+    """
+    Returns the bcrypt cost factor new hashes are created with.
+    """
+    return _cost
+
+
+def set_cost(cost: int) -> None:
+    """
+    Sets the bcrypt cost factor new hashes are created with.
+
+    Args:
+    - cost (int): log2 of the number of rounds, between 4 and 31.
+    """
+    global _cost
+    if not MIN_COST <= cost <= MAX_COST:
+        raise ValueError(f"bcrypt cost must be in [{MIN_COST}, {MAX_COST}]")
+    _cost = cost
+
+
+def calibrate_cost(target_ms: float = 250.0, min_cost: int = 10,
+                   max_cost: int = 16, samples: int = 3) -> int:
+    """
+    Picks the highest cost whose hash time on this host stays under
+    target_ms and makes it the cost for new hashes.
+
+    Each extra cost step doubles the work, so the time is measured once
+    at min_cost and extrapolated.
+
+    Args:
+    - target_ms (float): Latency budget for a single hash in milliseconds.
+    - min_cost (int): Lowest cost to use, even if it exceeds the budget.
+    - max_cost (int): Highest cost to consider.
+    - samples (int): Timings taken at min_cost; the fastest is used.
+
+    Returns:
+    - int: The selected cost.
+    """
+    salt = bcrypt.gensalt(rounds=min_cost)
+    elapsed = None
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        sample = (time.perf_counter() - start) * 1000
+        elapsed = sample if elapsed is None else min(elapsed, sample)
+
+    cost = min_cost
+    while cost < max_cost and elapsed * 2 <= target_ms:
+        elapsed *= 2
+        cost += 1
+    set_cost(cost)
+    return cost
+
+
+def hash_cost(hashed_password: bytes) -> int:
+    """
+    Returns the cost factor a bcrypt hash was created with.
+
+    Args:
+    - hashed_password (bytes): Hash such as b"$2b$12$...".
+
+    Returns:
+    - int: The cost factor.
+    """
+    return int(hashed_password.split(b'$')[2])
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Tells whether a stored hash uses a lower cost than the current one.
+
+    Args:
+    - hashed_password (bytes): Salted, hashed password stored in bytes.
+
+    Returns:
+    - bool: True if the password should be rehashed at next login.
+    """
+    return hash_cost(hashed_password) < _cost
+
+
+def verify_and_rehash(hashed_password: bytes,
+                      password: str) -> Tuple[bool, Optional[bytes]]:
+    """
+    Validates a password and rehashes it if its hash is outdated.
+
+    Args:
+    - hashed_password (bytes): Salted, hashed password stored in bytes.
+    - password (str): Password string to validate.
+
+    Returns:
+    - tuple: (valid, new_hash) where new_hash is the password hashed at
+    the current cost when it is valid and the stored hash is outdated,
+    None otherwise.
+    """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, hash_password(password)
+    return True, None
+
+
+def get_executor(max_workers: Optional[int] = None) -> ThreadPoolExecutor:
+    """
+    Returns the shared thread pool bcrypt work is offloaded to.
+
+    bcrypt releases the GIL while hashing, so one thread per core lets
+    hashes run in parallel.
+
+    Args:
+    - max_workers (int): Pool size used when the pool is first created.
+    Defaults to the number of CPUs.
+
+    Returns:
+    - ThreadPoolExecutor: The shared pool.
+    """
+    global _executor, _workers
+    with _executor_lock:
+        if _executor is None:
+            _workers = max_workers or os.cpu_count() or 1
+            _executor = ThreadPoolExecutor(max_workers=_workers,
+                                           thread_name_prefix="bcrypt")
+        return _executor
+
+
+def _map_bounded(func: Callable, items: Iterable) -> List:
+    """
+    Runs func over items on the pool, keeping at most a few tasks per
+    worker in flight so large batches don't queue one future per item.
+    """
+    executor = get_executor()
+    window = _workers * 4
+    pending = deque()
+    results = []
+    for item in items:
+        if len(pending) >= window:
+            results.append(pending.popleft().result())
+        pending.append(executor.submit(func, *item))
+    while pending:
+        results.append(pending.popleft().result())
+    return results
+
+
+def hash_password_future(password: str) -> Future:
+    """
+    Hashes a password on the shared pool.
+
+    Args:
+    - password (str): Password string to hash.
+
+    Returns:
+    - Future: Resolves to the salted, hashed password.
+    """
+    return get_executor().submit(hash_password, password)
+
+
+def is_valid_future(hashed_password: bytes, password: str) -> Future:
+    """
+    Validates a password against a hashed password on the shared pool.
+
+    Args:
+    - hashed_password (bytes): Salted, hashed password stored in bytes.
+    - password (str): Password string to validate.
+
+    Returns:
+    - Future: Resolves to True if the password matches.
+    """
+    return get_executor().submit(is_valid, hashed_password, password)
+
+
+def hash_passwords(passwords: Iterable[str]) -> List[bytes]:
+    """
+    Hashes many passwords in parallel.
+
+    Args:
+    - passwords (iterable of str): Password strings to hash.
+
+    Returns:
+    - list of bytes: Hashed passwords, in the order given.
+    """
+    return _map_bounded(hash_password, ((p,) for p in passwords))
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]]) -> List[bool]:
+    """
+    Validates many passwords in parallel.
+
+    Args:
+    - pairs (iterable of (bytes, str)): Hashed password and password
+    string to validate against it.
+
+    Returns:
+    - list of bool: Validation results, in the order given.
+    """
+    return _map_bounded(is_valid, pairs)
+
+
+async def hash_password_async(password: str) -> bytes:
+    """
+    Awaitable hash_password running on the shared pool.
+
+    Args:
+    - password (str): Password string to hash.
+
+    Returns:
+    - bytes: Salted, hashed password as a byte string.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), hash_password,
+                                      password)
+
+
+async def is_valid_async(hashed_password: bytes, password: str) -> bool:
+    """
+    Awaitable is_valid running on the shared pool.
+
+    Args:
+    - hashed_password (bytes): Salted, hashed password stored in bytes.
+    - password (str): Password string to validate.
+
+    Returns:
+    - bool: True if the password matches the hashed password.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), is_valid,
+                                      hashed_password, password)
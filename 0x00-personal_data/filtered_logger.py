@@ -3,15 +3,34 @@
 filtered_logger.py
 """
 
+import argparse
 import logging
 import csv
 import os
+import queue
 import re
-from typing import List
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import repeat
+from os import environ
+from typing import (Callable, Dict, Iterator, Iterable, List, Optional,
+                    Pattern, Sequence, Tuple)
 import mysql.connector
+from mysql.connector.errors import PoolError
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+BATCH_SIZE = 1000
+# Batches per key range in parallel mode, which bounds the redacted
+# output a worker hands back to the parent
+RANGE_BATCHES = 10
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
 
 
 def filter_datum(fields: List[str], redaction: str, message: str,
@@ -29,10 +48,56 @@ def filter_datum(fields: List[str], redaction: str, message: str,
     Returns:
     - str: Log message with specified fields obfuscated.
     """
-    for field in fields:
-        message = re.sub(f'{field}=(.*?){separator}',
-                         f'{field}={redaction}{separator}', message)
-    return message
+    return redactor(tuple(fields), redaction, separator)(message)
+
+
+@lru_cache(maxsize=128)
+def redaction_pattern(fields: Tuple[str, ...], separator: str) -> Pattern:
+    """
+    Compiles a single alternation pattern matching any of the given fields.
+
+    The pattern is cached per (fields, separator) pair, so redacting a
+    message costs one pass over it no matter how many fields are listed.
+
+    Args:
+    - fields (tuple of str): Field names to obfuscate.
+    - separator (str): Separator character used to separate fields.
+
+    Returns:
+    - Pattern: Compiled pattern capturing the field name as "field".
+    """
+    alternation = '|'.join(fields) if fields else '(?!)'
+    # The separator is matched literally, metacharacters included
+    literal = re.escape(separator)
+    value = '(.*?)'
+    if len(separator) == 1 and separator != '\n':
+        # Same match as the lazy '.*?' but without backtracking
+        value = f'([^{literal}\\n]*)'
+    return re.compile(f'(?P<field>{alternation})={value}{literal}')
+
+
+@lru_cache(maxsize=128)
+def redactor(fields: Tuple[str, ...], redaction: str,
+             separator: str) -> Callable[[str], str]:
+    """
+    Returns a function redacting the given fields of a message in one pass.
+
+    Args:
+    - fields (tuple of str): Field names to obfuscate.
+    - redaction (str): String used to replace obfuscated fields.
+    - separator (str): Separator character used to separate fields.
+
+    Returns:
+    - Callable: Function taking a message and returning it redacted.
+    """
+    pattern = redaction_pattern(fields, separator)
+    suffix = f'={redaction}{separator}'
+
+    def replace(match) -> str:
+        """ Keeps the field name and redacts its value """
+        return match.group('field') + suffix
+
+    return partial(pattern.sub, replace)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -45,19 +110,158 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         super().__init__(self.FORMAT)
         self.fields = fields
+        self._redact = redactor(tuple(fields), self.REDACTION,
+                                self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
-        """ Returns filtered values """
-        message = super().format(record)
-        return filter_datum(
-            self.fields, self.REDACTION,
-            message, self.SEPARATOR
-        )
+        """ Returns filtered values
+
+        A record carrying a ``rows`` attribute (see ``log_rows``) is
+        rendered as one line per row, all sharing the record's header,
+        and redacted in a single pass.
+        """
+        rows = getattr(record, "rows", None)
+        if rows is None:
+            message = super().format(record)
+        else:
+            # FORMAT ends with the message, so formatting an empty message
+            # yields the header every row line starts with.
+            msg, args = record.msg, record.args
+            record.msg, record.args = "", None
+            header = super().format(record)
+            record.msg, record.args = msg, args
+            message = "\n".join(header + row for row in rows)
+        return self._redact(message)
 
 
-def get_logger() -> logging.Logger:
+class AsyncRedactingHandler(logging.Handler):
+    """ Handler that queues records for a background writer thread
+
+    The calling thread only enqueues the record. Redaction, formatting
+    and the (batched) write to the stream all happen on the writer thread.
+    """
+
+    def __init__(self, stream=None, maxsize: int = 10000,
+                 overflow: str = "block", batch_size: int = 256):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stderr
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._dropped = 0
+        self._flushed = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._run,
+                                        name="user_data-writer",
+                                        daemon=True)
+        self._writer.start()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """ Returns the enqueued, dropped and flushed record counters """
+        with self._stats_lock:
+            return {"enqueued": self._enqueued,
+                    "dropped": self._dropped,
+                    "flushed": self._flushed}
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        """ Increments one of the record counters """
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """ Enqueues a record according to the overflow policy """
+        if self._closed:
+            self._count("_dropped")
+            return
+        if self.overflow == "block":
+            self._queue.put(record)
+            self._count("_enqueued")
+            return
+        while True:
+            try:
+                self._queue.put_nowait(record)
+                self._count("_enqueued")
+                return
+            except queue.Full:
+                if self.overflow == "drop-newest":
+                    self._count("_dropped")
+                    return
+            try:
+                oldest = self._queue.get_nowait()
+            except queue.Empty:
+                continue
+            self._queue.task_done()
+            self._count("_dropped")
+            if oldest is None:
+                # close() is waiting on the writer: give the stop
+                # sentinel back its place and drop this record instead
+                self._queue.put(None)
+                return
+
+    def _run(self) -> None:
+        """ Drains the queue, writing records in batches """
+        while True:
+            record = self._queue.get()
+            batch = [record]
+            while record is not None and len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(record)
+            records = [r for r in batch if r is not None]
+            if records:
+                self._write(records)
+            for _ in batch:
+                self._queue.task_done()
+            if len(records) != len(batch):
+                return
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        """ Formats records and writes them with a single call """
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record) + "\n")
+            except Exception:
+                self.handleError(record)
+        try:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        self._count("_flushed", len(lines))
+
+    def flush(self) -> None:
+        """ Blocks until every queued record has been written """
+        if not self._closed:
+            self._queue.join()
+
+    def close(self) -> None:
+        """ Flushes pending records and stops the writer thread """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._writer.join()
+        super().close()
+
+
+def get_logger(asynchronous: bool = False, maxsize: int = 10000,
+               overflow: str = "block") -> logging.Logger:
     """
     Returns a logging.Logger object named "user_data".
+
+    Args:
+    - asynchronous (bool): Write through a bounded queue and a background
+    writer thread instead of on the calling thread.
+    - maxsize (int): Capacity of the queue in asynchronous mode.
+    - overflow (str): What to do when the queue is full, one of
+    "block", "drop-oldest" or "drop-newest".
     """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)  # Set logging level to INFO
@@ -65,8 +269,12 @@ def get_logger() -> logging.Logger:
     # Prevent propagation of log messages to other loggers
     logger.propagate = False
 
-    # Create a StreamHandler with RedactingFormatter
-    stream_handler = logging.StreamHandler()
+    # Create a StreamHandler (or its queued variant) with RedactingFormatter
+    if asynchronous:
+        stream_handler = AsyncRedactingHandler(maxsize=maxsize,
+                                               overflow=overflow)
+    else:
+        stream_handler = logging.StreamHandler()
     formatter = RedactingFormatter(fields=PII_FIELDS)
     stream_handler.setFormatter(formatter)
 
@@ -90,21 +298,430 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return cnx
 
 
-def main():
+class ConnectionPool:
+    """ Pool of reusable database connections created by ``factory``
+
+    Idle connections older than ``idle_timeout`` seconds are closed,
+    borrowed connections are pinged before being handed out when
+    ``health_check`` is set, and connections held for longer than
+    ``leak_timeout`` seconds are reported as leaks.
+
+    The lock only guards the bookkeeping: connecting, pinging and
+    closing happen outside it, on a slot reserved beforehand, so a slow
+    server never holds up the other borrowers.
+    """
+
+    def __init__(self, factory: Callable = get_db, size: int = 5,
+                 idle_timeout: float = 300.0, leak_timeout: float = 60.0,
+                 health_check: bool = True):
+        self.factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.leak_timeout = leak_timeout
+        self.health_check = health_check
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._borrowed = {}
+        self._reserved = 0
+        self._reported = set()
+        self._created = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """ Returns borrowed/idle counts and time spent waiting """
+        with self._cond:
+            return {"size": self.size,
+                    "borrowed": len(self._borrowed),
+                    "idle": len(self._idle),
+                    "created": self._created,
+                    "waits": self._waits,
+                    "wait_time": self._wait_time,
+                    "max_wait_time": self._max_wait_time}
+
+    def _discard(self, cnx) -> None:
+        """ Closes a connection, ignoring errors from dead sockets """
+        try:
+            cnx.close()
+        except Exception:
+            pass
+
+    def _healthy(self, cnx) -> bool:
+        """ Returns True if the connection still answers """
+        try:
+            return cnx.is_connected()
+        except Exception:
+            return False
+
+    def _evict_idle(self, now: float) -> List:
+        """ Removes and returns the idle connections past idle_timeout
+        (lock must be held; close them once it is released) """
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        return expired
+
+    def leaks(self) -> List[Tuple[int, float]]:
+        """ Returns (connection id, seconds held) of leaked connections """
+        now = time.monotonic()
+        with self._cond:
+            return [(key, now - since)
+                    for key, (_, since) in self._borrowed.items()
+                    if now - since > self.leak_timeout]
+
+    def _report_leaks(self) -> None:
+        """ Logs each leaked connection once """
+        for key, held in self.leaks():
+            if key not in self._reported:
+                self._reported.add(key)
+                logging.getLogger("user_data.pool").warning(
+                    "connection %x borrowed %.1fs ago was not returned",
+                    key, held)
+
+    def borrow(self, timeout: Optional[float] = None):
+        """ Returns a connection, waiting up to ``timeout`` seconds
+
+        Raises:
+        - PoolError: If no connection became available in time.
+        """
+        self._report_leaks()
+        start = time.monotonic()
+        waited = False
+        expired = []
+        try:
+            with self._cond:
+                while True:
+                    expired += self._evict_idle(time.monotonic())
+                    if self._idle:
+                        cnx = self._idle.pop()[0]
+                        break
+                    if len(self._borrowed) + self._reserved < self.size:
+                        cnx = None
+                        break
+                    remaining = None
+                    if timeout is not None:
+                        remaining = timeout - (time.monotonic() - start)
+                        if remaining <= 0:
+                            raise PoolError("Connection pool exhausted")
+                    waited = True
+                    self._cond.wait(remaining)
+                self._reserved += 1
+        finally:
+            for expired_cnx in expired:
+                self._discard(expired_cnx)
+
+        created = False
+        try:
+            if cnx is not None and self.health_check \
+                    and not self._healthy(cnx):
+                self._discard(cnx)
+                cnx = None
+            if cnx is None:
+                cnx = self.factory()
+                created = True
+        except BaseException:
+            with self._cond:
+                self._reserved -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._reserved -= 1
+            self._created += created
+            self._borrowed[id(cnx)] = (cnx, time.monotonic())
+            if waited:
+                wait_time = time.monotonic() - start
+                self._waits += 1
+                self._wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+        return cnx
+
+    def _reset(self, cnx) -> bool:
+        """ Drops unread results and rolls back any open transaction,
+        so the next borrower starts clean; returns False on failure """
+        try:
+            if getattr(cnx, "unread_result", False):
+                cnx.consume_results()
+            cnx.rollback()
+            return True
+        except Exception:
+            return False
+
+    def release(self, cnx) -> None:
+        """ Returns a borrowed connection to the pool
+
+        The connection is reset (see _reset) outside the lock, its slot
+        staying reserved meanwhile, and closed if that fails.
+        """
+        with self._cond:
+            if self._borrowed.pop(id(cnx), None) is None:
+                return
+            self._reported.discard(id(cnx))
+            self._reserved += 1
+        reset = self._reset(cnx)
+        if not reset:
+            self._discard(cnx)
+        with self._cond:
+            self._reserved -= 1
+            # No ping here: borrow() checks idle connections when
+            # health_check is set
+            if reset:
+                self._idle.append((cnx, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def cursor(self, timeout: Optional[float] = None, **kwargs) -> Iterator:
+        """ Yields a cursor whose connection goes back to the pool on exit
+        """
+        cnx = self.borrow(timeout)
+        try:
+            cursor = cnx.cursor(**kwargs)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+        finally:
+            self.release(cnx)
+
+    def close(self) -> None:
+        """ Closes every idle connection """
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+        for cnx, _ in idle:
+            self._discard(cnx)
+
+
+@lru_cache(maxsize=None)
+def get_db_pool() -> ConnectionPool:
+    """ Returns the process-wide pool of connections made by get_db
+
+    Configured by the PERSONAL_DATA_DB_POOL_SIZE,
+    PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT, PERSONAL_DATA_DB_POOL_LEAK_TIMEOUT
+    and PERSONAL_DATA_DB_POOL_HEALTH_CHECK environment variables.
+    """
+    return ConnectionPool(
+        factory=get_db,
+        size=int(environ.get("PERSONAL_DATA_DB_POOL_SIZE", "5")),
+        idle_timeout=float(
+            environ.get("PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT", "300")),
+        leak_timeout=float(
+            environ.get("PERSONAL_DATA_DB_POOL_LEAK_TIMEOUT", "60")),
+        health_check=environ.get(
+            "PERSONAL_DATA_DB_POOL_HEALTH_CHECK", "1") != "0")
+
+
+def format_row(row: Sequence, field_names: Sequence[str]) -> str:
+    """
+    Renders a database row as "field=value;" pairs separated by spaces.
+    """
+    return ' '.join(f'{f}={r};' for r, f in zip(row, field_names))
+
+
+def log_rows(logger: logging.Logger, rows: Iterable[str]) -> None:
+    """
+    Logs a batch of row lines as a single record, so the formatter and
+    the handler each run once per batch instead of once per row.
+    """
+    rows = list(rows)
+    logger.info("%d rows", len(rows), extra={"rows": rows})
+
+
+def main(batch_size: int = BATCH_SIZE):
     """
     Obtain a database connection using get_db and retrieves all rows
     in the users table and display each row under a filtered format
+
+    Rows are streamed from an unbuffered cursor with fetchmany, so at
+    most one batch of ``batch_size`` rows is held in memory at a time.
     """
     db = get_db()
-    cursor = db.cursor()
+    cursor = db.cursor(buffered=False)
     cursor.execute("SELECT * FROM users;")
     field_names = [i[0] for i in cursor.description]
 
     logger = get_logger()
 
-    for row in cursor:
-        str_row = ''.join(f'{f}={str(r)}; ' for r, f in zip(row, field_names))
-        logger.info(str_row.strip())
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        log_rows(logger, (format_row(row, field_names) for row in rows))
 
     cursor.close()
     db.close()
+
+
+def column_name(name: str) -> str:
+    """
+    Returns ``name`` if it is a plain SQL identifier, as it is
+    interpolated into queries.
+
+    Raises:
+    - ValueError: If it is not.
+    """
+    if not IDENTIFIER.fullmatch(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return name
+
+
+def key_ranges(low: int, high: int, count: int) -> List[Tuple[int, int]]:
+    """
+    Splits the inclusive key range [low, high] into at most ``count``
+    contiguous half-open ranges [start, end).
+    """
+    step = max(1, -(-(high - low + 1) // count))
+    return [(start, min(start + step, high + 1))
+            for start in range(low, high + 1, step)]
+
+
+def row_ranges(cursor, key: str, low: int, high: int,
+               rows: int) -> Iterator[Tuple[int, int]]:
+    """
+    Splits the keys of the users table from ``low`` to ``high`` into
+    contiguous half-open ranges [start, end) of about ``rows`` rows
+    each, on actual key values, so sparse or huge keys don't produce
+    empty ranges.
+
+    Each boundary costs one indexed ``ORDER BY key LIMIT 1 OFFSET rows``
+    query on ``cursor`` (buffered), run as the ranges are consumed.
+    """
+    key = column_name(key)
+    start = low
+    while True:
+        cursor.execute(f"SELECT {key} FROM users WHERE {key} >= %s "
+                       f"ORDER BY {key} LIMIT 1 OFFSET %s;", (start, rows))
+        row = cursor.fetchone()
+        end = row[0] if row is not None else None
+        if end == start:
+            # More than ``rows`` rows share this key: keep them together
+            cursor.execute(f"SELECT MIN({key}) FROM users "
+                           f"WHERE {key} > %s;", (start,))
+            end = cursor.fetchone()[0]
+        if end is None:
+            yield start, high + 1
+            return
+        yield start, end
+        start = end
+
+
+def redact_range(key: str, start: int, end: int, batch_size: int,
+                 shard_path: Optional[str] = None) -> str:
+    """
+    Redacts the users whose ``key`` lies in [start, end).
+
+    Runs in a worker process with its own database connection. The
+    redacted lines are written to ``shard_path`` when given (and the path
+    is returned), otherwise they are returned for the parent to merge.
+    """
+    key = column_name(key)
+    formatter = RedactingFormatter(fields=PII_FIELDS)
+    db = get_db()
+    cursor = db.cursor(buffered=False)
+    cursor.execute(f"SELECT * FROM users WHERE {key} >= %s AND {key} < %s "
+                   f"ORDER BY {key};", (start, end))
+    field_names = [i[0] for i in cursor.description]
+
+    chunks = []
+    out = open(shard_path, 'w') if shard_path is not None else None
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            record = logging.makeLogRecord({
+                "name": "user_data", "levelno": logging.INFO,
+                "levelname": "INFO", "msg": "%d rows", "args": (len(rows),),
+            })
+            record.rows = [format_row(row, field_names) for row in rows]
+            text = formatter.format(record) + "\n"
+            if out is not None:
+                out.write(text)
+            else:
+                chunks.append(text)
+    finally:
+        if out is not None:
+            out.close()
+        cursor.close()
+        db.close()
+    return shard_path if out is not None else ''.join(chunks)
+
+
+def parallel_main(workers: int, key: str = "id",
+                  batch_size: int = BATCH_SIZE,
+                  shard_dir: Optional[str] = None) -> None:
+    """
+    Redacts the users table with a pool of ``workers`` processes.
+
+    The table is split into ``key`` ranges. Without ``shard_dir`` the
+    ranges are redacted in parallel and written to stderr in key order;
+    with it, each range is written to its own ``users.<n>.log`` file.
+    """
+    key = column_name(key)
+    db = get_db()
+    cursor = db.cursor(buffered=True)
+    try:
+        cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM users;")
+        low, high = cursor.fetchone()
+        if low is not None:
+            _redact_ranges(cursor, workers, key, low, high, batch_size,
+                           shard_dir)
+    finally:
+        cursor.close()
+        db.close()
+
+
+def _redact_ranges(cursor, workers: int, key: str, low: int, high: int,
+                   batch_size: int, shard_dir: Optional[str]) -> None:
+    """
+    Body of parallel_main once the table is known not to be empty.
+    """
+    if shard_dir is not None:
+        ranges = key_ranges(low, high, workers)
+        os.makedirs(shard_dir, exist_ok=True)
+        shard_paths = [os.path.join(shard_dir, f"users.{i}.log")
+                       for i in range(len(ranges))]
+    else:
+        # Ranges of about RANGE_BATCHES batches, with at most two per
+        # worker in flight, bound the redacted output held in memory
+        # while it waits for its turn to be written, whatever the size
+        # of the table or the spread of its keys.
+        ranges = row_ranges(cursor, key, low, high,
+                            batch_size * RANGE_BATCHES)
+        shard_paths = repeat(None)
+
+    def collect(future) -> None:
+        """ Writes the output of a range to stderr, unless sharded """
+        result = future.result()
+        if shard_dir is None:
+            sys.stderr.write(result)
+            sys.stderr.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for (start, end), path in zip(ranges, shard_paths):
+            if len(pending) >= workers * 2:
+                collect(pending.popleft())
+            pending.append(pool.submit(redact_range, key, start, end,
+                                       batch_size, path))
+        while pending:
+            collect(pending.popleft())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redacted users dump")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of redaction processes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="rows fetched per round trip")
+    parser.add_argument("--key", default="id", type=column_name,
+                        help="integer column used to split the table")
+    parser.add_argument("--shard-dir", default=None,
+                        help="write one file per range into this directory")
+    options = parser.parse_args()
+    if options.workers > 1:
+        parallel_main(options.workers, options.key, options.batch_size,
+                      options.shard_dir)
+    else:
+        main(options.batch_size)
@@ -4,6 +4,7 @@ Route module for the API
 """
 
 from os import getenv
+from api.v1 import metrics
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -11,10 +12,15 @@ import os
 
 
 app = Flask(__name__)
+metrics.init_app(app)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 AUTH_TYPE = getenv("AUTH_TYPE")
+EXCLUDED_PATHS = ('/api/v1/status/',
+                  '/api/v1/unauthorized/',
+                  '/api/v1/forbidden/',
+                  '/api/v1/metrics/')
 
 if AUTH_TYPE == "auth":
     from api.v1.auth.auth import Auth
@@ -53,11 +59,9 @@ def before_request() -> str:
     if auth is None:
         return
 
-    excluded_paths = ['/api/v1/status/',
-                      '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/']
-
-    if not auth.require_auth(request.path, excluded_paths):
+    with metrics.phase("require_auth"):
+        required = auth.require_auth(request.path, EXCLUDED_PATHS)
+    if not required:
         return
 
     if auth.authorization_header(request) is None:
@@ -4,7 +4,58 @@ Auth module for API authentication
 """
 
 from flask import request
-from typing import List, TypeVar
+from functools import lru_cache
+from typing import List, Sequence, Tuple, TypeVar
+
+
+class PathMatcher:
+    """ Excluded paths compiled for fast lookups
+
+    Exact paths go into a set and paths ending with '*' into a prefix
+    trie, so a check costs one set lookup plus one walk over the path,
+    whatever the number of excluded paths. Recent decisions are memoized.
+    """
+
+    _END = ''
+
+    def __init__(self, excluded_paths: Sequence[str], cache_size: int = 1024):
+        """ Compile the excluded paths """
+        self._exact = set()
+        self._prefixes = {}
+        for exc in excluded_paths:
+            if len(exc) == 0:
+                continue
+            if exc[-1] != '*':
+                self._exact.add(exc)
+                continue
+            node = self._prefixes
+            for char in exc[:-1]:
+                node = node.setdefault(char, {})
+            node[self._END] = True
+        self.is_excluded = lru_cache(maxsize=cache_size)(self._is_excluded)
+
+    def _is_excluded(self, path: str) -> bool:
+        """ Whether a path matches one of the excluded paths """
+        tmp_path = path if path[-1] == '/' else path + '/'
+        if tmp_path in self._exact:
+            return True
+
+        node = self._prefixes
+        if self._END in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: Tuple[str, ...]) -> PathMatcher:
+    """ Return the (cached) matcher of a tuple of excluded paths """
+    return PathMatcher(excluded_paths)
 
 
 class Auth:
@@ -15,29 +66,13 @@ class Auth:
         if path is None or excluded_paths is None or excluded_paths == []:
             return True
 
-        l_path = len(path)
-        if l_path == 0:
+        if len(path) == 0:
             return True
 
-        slash_path = True if path[l_path - 1] == '/' else False
-
-        tmp_path = path
-        if not slash_path:
-            tmp_path += '/'
-
-        for exc in excluded_paths:
-            l_exc = len(exc)
-            if l_exc == 0:
-                continue
-
-            if exc[l_exc - 1] != '*':
-                if tmp_path == exc:
-                    return False
-            else:
-                if exc[:-1] == path[:l_exc - 1]:
-                    return False
-
-        return True
+        if not isinstance(excluded_paths, tuple):
+            excluded_paths = tuple(excluded_paths)
+        matcher = compile_excluded_paths(excluded_paths)
+        return not matcher.is_excluded(path)
 
     def authorization_header(self, request=None) -> str:
         """ Method that handles authorization header """
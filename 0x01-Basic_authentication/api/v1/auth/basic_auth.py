@@ -2,9 +2,12 @@
 """
 BasicAuth module for the API
 """
+from api.v1 import metrics
 from api.v1.auth.auth import Auth
+from api.v1.auth.credential_cache import CredentialCache
 
 import base64
+from os import getenv
 
 from models.user import User
 
@@ -14,6 +17,15 @@ class BasicAuth(Auth):
     BasicAuth class that inherits from Auth
     """
 
+    def __init__(self):
+        """
+        Initializes the cache of verified Authorization headers, sized by
+        BASIC_AUTH_CACHE_SIZE entries and BASIC_AUTH_CACHE_TTL seconds
+        """
+        self.credential_cache = CredentialCache(
+            maxsize=int(getenv("BASIC_AUTH_CACHE_SIZE", "1024")),
+            ttl=float(getenv("BASIC_AUTH_CACHE_TTL", "300")))
+
     def extract_base64_authorization_header(
         self, authorization_header: str
     ) -> str:
@@ -110,14 +122,17 @@ class BasicAuth(Auth):
         ):
             return None
 
-        users = User.search({'email': user_email})
+        with metrics.phase("user_lookup"):
+            users = User.search({'email': user_email})
 
         if not users:
             return None
 
         user = users[0]
 
-        if not user.is_valid_password(user_pwd):
+        with metrics.phase("password_verification"):
+            valid = user.is_valid_password(user_pwd)
+        if not valid:
             return None
 
         return user
@@ -141,12 +156,26 @@ class BasicAuth(Auth):
         if not auth_header:
             return None
 
-        base64_part = self.extract_base64_authorization_header(auth_header)
+        with metrics.phase("credential_cache"):
+            cached = self.credential_cache.get(auth_header)
+            user = None
+            if cached is not None:
+                user = User.get(cached[0])
+                if user is not None and user.password != cached[1]:
+                    user = None
+        if user is not None:
+            return user
+
+        with metrics.phase("header_extraction"):
+            base64_part = self.extract_base64_authorization_header(
+                auth_header)
 
         if not base64_part:
             return None
 
-        decoded_str = self.decode_base64_authorization_header(base64_part)
+        with metrics.phase("base64_decode"):
+            decoded_str = self.decode_base64_authorization_header(
+                base64_part)
 
         if not decoded_str:
             return None
@@ -156,4 +185,7 @@ class BasicAuth(Auth):
         if not email or not password:
             return None
 
-        return self.user_object_from_credentials(email, password)
+        user = self.user_object_from_credentials(email, password)
+        if user is not None:
+            self.credential_cache.put(auth_header, user.id, user.password)
+        return user
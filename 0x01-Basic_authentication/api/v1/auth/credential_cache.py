@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cache of verified Basic Authentication credentials
+"""
+from collections import OrderedDict
+import hashlib
+import hmac
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from models import base
+
+
+class CredentialCache:
+    """ Bounded LRU cache with TTL mapping an Authorization header
+    to the id of the user it was verified against
+
+    Headers are stored as HMAC digests under a per-process random key,
+    so the cache never holds credentials in clear text. Entries also
+    remember the password hash they were verified with and are dropped
+    when the user is saved with another password or removed.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        """ Initialize the cache and subscribe to model changes
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        base.LISTENERS.append(self._on_change)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """ Hit, miss, eviction and invalidation counters
+        """
+        with self._lock:
+            return {"size": len(self._entries),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations}
+
+    def _key(self, authorization_header: str) -> bytes:
+        """ Keyed digest of a header value
+        """
+        return hmac.new(self._secret, authorization_header.encode('utf-8'),
+                        hashlib.sha256).digest()
+
+    def _drop(self, key: bytes):
+        """ Remove one entry (lock must be held)
+        """
+        user_id, _, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+    def get(self, authorization_header: str) -> Optional[Tuple[str, str]]:
+        """ Return the (user id, password hash) a header was verified
+        against, or None
+        """
+        key = self._key(authorization_header)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, authorization_header: str, user_id: str, password: str):
+        """ Cache the user a header was verified against
+        """
+        if self.maxsize <= 0:
+            return
+        key = self._key(authorization_header)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (user_id, password,
+                                  time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str, password: str = None):
+        """ Drop the entries of a user, or only those verified against
+        another password hash than password when it is given
+        """
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                if password is None or self._entries[key][1] != password:
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        """ Drop every entry
+        """
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _on_change(self, obj, op: str):
+        """ Model listener keeping the cache consistent with saves
+        and removals of users
+        """
+        if op == "remove":
+            self.invalidate_user(obj.id)
+        else:
+            self.invalidate_user(obj.id, getattr(obj, "password", None))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+""" Metrics module: request latency and auth phase histograms
+"""
+from contextlib import contextmanager
+from os import getenv
+from time import perf_counter
+from typing import Iterator, Tuple
+import random
+import threading
+
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SAMPLE_RATE = float(getenv("METRICS_SAMPLE_RATE", "1"))
+
+HELP = {
+    "http_request_duration_seconds": "Request latency by endpoint",
+    "auth_phase_duration_seconds": "Time spent in each auth phase",
+    "json_serialization_duration_seconds": "Time spent encoding JSON",
+    "persistence_duration_seconds": "Time spent writing the store to disk",
+}
+
+_state = threading.local()
+
+
+class Histogram():
+    """ Cumulative histogram with fixed buckets
+    """
+
+    def __init__(self):
+        """ Initialize an empty Histogram
+        """
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        """ Record one observation (lock held by the registry)
+        """
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += seconds
+
+
+class Registry():
+    """ Histograms keyed by metric name and labels
+    """
+
+    def __init__(self):
+        """ Initialize an empty Registry
+        """
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name: str, labels: Tuple[Tuple[str, str], ...],
+                seconds: float):
+        """ Record seconds in the histogram of name and labels
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self) -> str:
+        """ All histograms in the Prometheus text exposition format
+        """
+        with self._lock:
+            items = sorted((key, list(h.counts), h.total, h.sum)
+                           for key, h in self._histograms.items())
+        lines = []
+        current = None
+        for (name, labels), counts, total, total_sum in items:
+            if name != current:
+                current = name
+                lines.append("# HELP {} {}".format(name,
+                                                   HELP.get(name, "")))
+                lines.append("# TYPE {} histogram".format(name))
+            label_str = ",".join('{}="{}"'.format(k, _escape(v))
+                                 for k, v in labels)
+            prefix = label_str + "," if label_str else ""
+            suffix = "{" + label_str + "}" if label_str else ""
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(
+                    name, prefix, bound, cumulative))
+            lines.append('{}_bucket{{{}le="+Inf"}} {}'.format(
+                name, prefix, total))
+            lines.append("{}_sum{} {}".format(name, suffix, total_sum))
+            lines.append("{}_count{} {}".format(name, suffix, total))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    """ Escape a label value
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+
+def start_sample() -> bool:
+    """ Decide whether the current thread's request is measured
+    """
+    sampled = SAMPLE_RATE >= 1 or \
+        (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
+    _state.sampled = sampled
+    _state.start = perf_counter() if sampled else None
+    return sampled
+
+
+def end_sample() -> float:
+    """ Stop measuring the current request and return its duration,
+    or None if it wasn't sampled
+    """
+    start = getattr(_state, "start", None)
+    _state.sampled = False
+    _state.start = None
+    if start is None:
+        return None
+    return perf_counter() - start
+
+
+@contextmanager
+def timer(name: str, **labels: str) -> Iterator[None]:
+    """ Record the time spent in the block, when sampling the current
+    request
+    """
+    if not getattr(_state, "sampled", False):
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, tuple(sorted(labels.items())),
+                         perf_counter() - start)
+
+
+def phase(name: str):
+    """ Timer of one authentication phase
+    """
+    return timer("auth_phase_duration_seconds", phase=name)
+
+
+def _timed_classmethod(cls: type, attr: str, name: str, **labels: str):
+    """ Replace a classmethod of cls by a timed one
+    """
+    func = cls.__dict__[attr].__func__
+
+    def timed(klass, *args, **kwargs):
+        """ Timed wrapper """
+        with timer(name, **labels):
+            return func(klass, *args, **kwargs)
+
+    timed.__doc__ = func.__doc__
+    setattr(cls, attr, classmethod(timed))
+
+
+def init_app(app):
+    """ Measure request latency, JSON encoding and persistence of app
+
+    Must run before the other before_request handlers are registered so
+    the whole request is measured.
+    """
+    from flask import request
+    from models.base import Base
+
+    @app.before_request
+    def _start_request_timer():
+        """ Start measuring the request """
+        start_sample()
+
+    @app.after_request
+    def _stop_request_timer(response):
+        """ Record the request latency """
+        elapsed = end_sample()
+        if elapsed is not None:
+            rule = request.url_rule
+            REGISTRY.observe("http_request_duration_seconds", (
+                ("endpoint", rule.rule if rule else "unmatched"),
+                ("method", request.method),
+                ("status", str(response.status_code)),
+            ), elapsed)
+        return response
+
+    provider = getattr(app, "json", None)
+    if provider is not None and hasattr(provider, "dumps"):
+        dumps = provider.dumps
+
+        def timed_dumps(obj, **kwargs):
+            """ Timed JSON provider dumps """
+            with timer("json_serialization_duration_seconds"):
+                return dumps(obj, **kwargs)
+
+        provider.dumps = timed_dumps
+    else:
+        class TimedJSONEncoder(app.json_encoder):
+            """ JSON encoder recording its encoding time """
+
+            def encode(self, o):
+                """ Timed encode """
+                with timer("json_serialization_duration_seconds"):
+                    return super().encode(o)
+
+        app.json_encoder = TimedJSONEncoder
+
+    _timed_classmethod(Base, "_write_snapshot",
+                       "persistence_duration_seconds", op="snapshot")
+    _timed_classmethod(Base, "_append_to_log",
+                       "persistence_duration_seconds", op="append")
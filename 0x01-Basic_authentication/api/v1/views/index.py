@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import Response, jsonify, abort
+from api.v1 import metrics
 from api.v1.views import app_views
 
 
@@ -26,6 +27,16 @@ def stats() -> str:
     return jsonify(stats)
 
 
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics_view() -> str:
+    """ GET /api/v1/metrics
+    Return:
+      - latency histograms in the Prometheus text format
+    """
+    return Response(metrics.REGISTRY.render(),
+                    mimetype="text/plain; version=0.0.4")
+
+
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized() -> str:
     """ GET /api/v1/unauthorized
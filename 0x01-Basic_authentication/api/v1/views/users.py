@@ -2,18 +2,75 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, stream_with_context
+from itertools import islice
+from models import bulk
 from models.user import User
+import json
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (all optional):
+      - limit: maximum number of users returned
+      - after_id: only users stored after this User ID
+      - fields: comma separated attributes to return
+      - stream: "ndjson" (one user per line) or "json" (chunked list)
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented; with limit, the
+        X-Next-After-Id header holds the after_id of the next page
+      - 400 if limit isn't a positive integer, stream is unknown or
+        after_id isn't a User ID
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    after_id = request.args.get('after_id')
+    fields = request.args.get('fields')
+    stream = request.args.get('stream')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+    if stream not in (None, "ndjson", "json"):
+        return jsonify({'error': "stream must be ndjson or json"}), 400
+    if fields is not None:
+        fields = [f for f in fields.split(',') if f]
+    try:
+        users = User.iterate(after_id)
+    except ValueError:
+        return jsonify({'error': "after_id is not a User ID"}), 400
+
+    def _users():
+        page = users if limit is None else islice(users, limit)
+        for user in page:
+            user_json = user.to_json()
+            if fields is not None:
+                user_json = {f: user_json[f] for f in fields
+                             if f in user_json}
+            yield user.id, user_json
+
+    if stream == "ndjson":
+        lines = (json.dumps(user_json) + "\n" for _, user_json in _users())
+        return Response(stream_with_context(lines),
+                        mimetype="application/x-ndjson")
+    if stream == "json":
+        def _chunks():
+            separator = "["
+            for _, user_json in _users():
+                yield separator + json.dumps(user_json)
+                separator = ","
+            yield "[]" if separator == "[" else "]"
+        return Response(stream_with_context(_chunks()),
+                        mimetype="application/json")
+
+    page = list(_users())
+    response = jsonify([user_json for _, user_json in page])
+    if limit is not None and len(page) == limit:
+        response.headers['X-Next-After-Id'] = page[-1][0]
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -118,5 +175,42 @@ def update_user(user_id: str = None) -> str:
         user.first_name = rj.get('first_name')
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
-    user.save()
+    try:
+        user.save()
+    except ValueError as e:
+        return jsonify({'error': "Can't update User: {}".format(e)}), 400
     return jsonify(user.to_json()), 200
+
+
+@app_views.route('/users/bulk', methods=['POST', 'PUT', 'DELETE'],
+                 strict_slashes=False)
+def bulk_users() -> str:
+    """ POST|PUT|DELETE /api/v1/users/bulk
+    NDJSON body, one row per line:
+      - POST (create): email, password, and optionally first_name,
+        last_name
+      - PUT (update): id, and optionally first_name, last_name
+      - DELETE: id
+    Query parameter (optional):
+      - batch_size: number of rows written to file at once
+    Return:
+      - NDJSON stream of one result per row: line, id and status
+        ("created", "updated" or "deleted"), or line and error
+      - 400 if batch_size isn't a positive integer
+    """
+    op = {'POST': "create", 'PUT': "update", 'DELETE': "delete"}[
+        request.method]
+    try:
+        batch_size = int(request.args.get('batch_size', bulk.BATCH_SIZE))
+    except ValueError:
+        batch_size = 0
+    if batch_size <= 0:
+        return jsonify({'error': "batch_size must be a positive integer"}), 400
+
+    def _results():
+        rows = bulk.parse_ndjson(request.stream)
+        for result in bulk.apply_rows(op, rows, batch_size):
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(_results()),
+                    mimetype="application/x-ndjson")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+""" Memory benchmark of the User model
+
+Decodes users from their JSON text the way load_from_file does, once
+into the slots-based User and once into a replica of the previous
+__dict__-based layout, and prints the bytes used per user as JSON:
+everything the decoded users hold is counted, their strings included,
+as well as the dict keeping them by ID.
+"""
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from models.base import TIMESTAMP_FORMAT
+from models.user import User
+
+
+class DictUser():
+    """ Replica of the __dict__-based User, parsing every timestamp
+    """
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """ Initialize a DictUser instance
+        """
+        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.created_at = datetime.strptime(kwargs.get('created_at'),
+                                            TIMESTAMP_FORMAT)
+        self.updated_at = datetime.strptime(kwargs.get('updated_at'),
+                                            TIMESTAMP_FORMAT)
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+def make_records(count: int, per_second: int) -> list:
+    """ Users serialized as JSON text, per_second of them sharing each
+    timestamp
+    """
+    start = datetime(2024, 1, 1)
+    records = []
+    for i in range(count):
+        stamp = (start + timedelta(seconds=i // per_second)).strftime(
+            TIMESTAMP_FORMAT)
+        records.append(json.dumps({
+            "id": str(uuid.uuid4()),
+            "created_at": stamp,
+            "updated_at": stamp,
+            "email": "user{}@example.com".format(i),
+            "_password": hashlib.sha256(str(i).encode()).hexdigest(),
+            "first_name": None,
+            "last_name": None,
+        }))
+    return records
+
+
+def measure(build, records: list) -> float:
+    """ Bytes held per user once build has made objects of the decoded
+    records, kept in a dict by ID
+    """
+    gc.collect()
+    tracemalloc.start()
+    objs = {}
+    for record in records:
+        obj = build(json.loads(record))
+        objs[obj.id] = obj
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+    return current / len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--per-second", type=int, default=1,
+                        help="users created within the same second")
+    options = parser.parse_args()
+
+    records = make_records(options.users, options.per_second)
+    dict_bytes = measure(lambda obj_json: DictUser(**obj_json), records)
+    slots_bytes = measure(User.from_json, records)
+    json.dump({"python": platform.python_version(),
+               "users": options.users,
+               "per_second": options.per_second,
+               "dict_bytes_per_user": dict_bytes,
+               "slots_bytes_per_user": slots_bytes,
+               "ratio": dict_bytes / slots_bytes}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
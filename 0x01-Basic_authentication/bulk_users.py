@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" Bulk user import/export on the file store of the current directory
+
+    ./bulk_users.py create users.ndjson > results.ndjson
+    ./bulk_users.py export > backup.ndjson
+    ./bulk_users.py create --restore backup.ndjson
+
+Per-row results are written to stdout as NDJSON and a summary to stderr.
+"""
+import argparse
+import json
+import sys
+
+from models import bulk
+from models.user import User
+
+
+def main(options: argparse.Namespace) -> int:
+    """ Run the command, return the exit status """
+    User.load_from_file()
+    out = sys.stdout.buffer
+    if options.op == "export":
+        for line in bulk.export_users():
+            out.write(line)
+        return 0
+
+    with (sys.stdin.buffer if options.file == "-"
+          else open(options.file, 'rb')) as f:
+        counts = {}
+        for result in bulk.apply_rows(options.op, bulk.parse_ndjson(f),
+                                      options.batch_size, options.restore):
+            status = result.get("status", "error")
+            counts[status] = counts.get(status, 0) + 1
+            out.write(json.dumps(result).encode() + b"\n")
+    sys.stderr.write(json.dumps(counts) + "\n")
+    return 1 if counts.get("error") else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("op", choices=bulk.OPERATIONS + ("export",))
+    parser.add_argument("file", nargs="?", default="-",
+                        help="NDJSON rows (default: stdin)")
+    parser.add_argument("--batch-size", type=int, default=bulk.BATCH_SIZE,
+                        help="rows written to file at once")
+    parser.add_argument("--restore", action="store_true",
+                        help="create: accept id, created_at and hashed "
+                             "_password from an export")
+    options = parser.parse_intermixed_args()
+    if options.batch_size <= 0:
+        parser.error("--batch-size must be a positive integer")
+    sys.exit(main(options))
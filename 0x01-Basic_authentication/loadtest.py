@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+""" Load test of the Basic Auth API
+
+Replays a weighted mix of user CRUD traffic from concurrent clients,
+either in-process through Flask's test client (default, on a scratch
+store in a temporary directory) or against a running server (--url),
+and prints throughput, latency percentiles and error rates as JSON.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+
+MIX = {
+    "status": 1,
+    "list_users": 2,
+    "get_user": 5,
+    "create_user": 1,
+    "update_user": 1,
+    "delete_user": 1,
+}
+
+
+class HttpClient():
+    """ Client of a running server
+    """
+
+    def __init__(self, url: str):
+        """ Initialize a HttpClient on url """
+        import requests
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method: str, path: str, **kwargs):
+        """ Return (status code, decoded JSON body or None) """
+        response = self.session.request(method, self.url + path, **kwargs)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+
+class TestClient():
+    """ Client of the in-process app
+    """
+
+    def __init__(self, app):
+        """ Initialize a TestClient on app """
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, **kwargs):
+        """ Return (status code, decoded JSON body or None) """
+        response = self.client.open(path, method=method, **kwargs)
+        return response.status_code, response.get_json(silent=True)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """ Nearest-rank percentile of sorted values """
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(pct / 100 * len(values)))
+                      - 1))
+    return values[rank]
+
+
+def summarize(samples: Dict[str, List], elapsed: float) -> dict:
+    """ Throughput, latency percentiles (ms) and error rate per operation
+    """
+    def stats(entries):
+        latencies = sorted(latency for latency, _ in entries)
+        errors = sum(1 for _, ok in entries if not ok)
+        return {"requests": len(entries),
+                "throughput": len(entries) / elapsed if elapsed else 0.0,
+                "error_rate": errors / len(entries) if entries else 0.0,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p90_ms": percentile(latencies, 90) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "max_ms": (latencies[-1] if latencies else 0.0) * 1000}
+
+    everything = [entry for entries in samples.values() for entry in entries]
+    return {"elapsed_s": elapsed,
+            "total": stats(everything),
+            "operations": {op: stats(entries)
+                           for op, entries in sorted(samples.items())}}
+
+
+class Worker(threading.Thread):
+    """ Virtual client issuing requests from the mix
+    """
+
+    def __init__(self, client, auth: dict, user_ids: List[str],
+                 lock: threading.Lock, requests: int, seed: int):
+        """ Initialize a Worker sending requests requests """
+        super().__init__(daemon=True)
+        self.client = client
+        self.headers = auth
+        self.user_ids = user_ids
+        self.lock = lock
+        self.requests = requests
+        self.rng = random.Random(seed)
+        self.samples = {op: [] for op in MIX}
+        self.created = 0
+
+    def pick_user(self) -> str:
+        """ Random known user ID, or None """
+        with self.lock:
+            if not self.user_ids:
+                return None
+            return self.rng.choice(self.user_ids)
+
+    def step(self, op: str) -> bool:
+        """ Issue one request, return whether it succeeded """
+        headers = self.headers
+        if op == "status":
+            status, _ = self.client.request("GET", "/api/v1/status")
+            return status == 200
+        if op == "list_users":
+            status, _ = self.client.request(
+                "GET", "/api/v1/users?limit=50", headers=headers)
+            return status == 200
+        if op == "create_user":
+            self.created += 1
+            email = "load-{}-{}-{}@example.com".format(
+                self.ident, self.created, self.rng.random())
+            status, body = self.client.request(
+                "POST", "/api/v1/users", headers=headers,
+                json={"email": email, "password": "pwd"})
+            if status == 201:
+                with self.lock:
+                    self.user_ids.append(body["id"])
+            return status == 201
+        user_id = self.pick_user()
+        if user_id is None:
+            return True
+        if op == "get_user":
+            status, _ = self.client.request(
+                "GET", "/api/v1/users/" + user_id, headers=headers)
+        elif op == "update_user":
+            status, _ = self.client.request(
+                "PUT", "/api/v1/users/" + user_id, headers=headers,
+                json={"first_name": "Load"})
+        else:
+            with self.lock:
+                if user_id in self.user_ids:
+                    self.user_ids.remove(user_id)
+            status, _ = self.client.request(
+                "DELETE", "/api/v1/users/" + user_id, headers=headers)
+        # Another worker may have deleted the user in the meantime
+        return status in (200, 404)
+
+    def run(self):
+        """ Send the requests """
+        ops = list(MIX)
+        weights = [MIX[op] for op in ops]
+        for _ in range(self.requests):
+            op = self.rng.choices(ops, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = self.step(op)
+            except Exception:
+                ok = False
+            self.samples[op].append((time.perf_counter() - start, ok))
+
+
+def main(options: argparse.Namespace) -> dict:
+    """ Run the load test and return the report """
+    if options.url:
+        def make_client():
+            return HttpClient(options.url)
+        email, password = options.email, options.password
+    else:
+        os.environ.setdefault("AUTH_TYPE", "basic_auth")
+        os.chdir(tempfile.mkdtemp())
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from api.v1.app import app
+        from models.user import User
+        email, password = "loadtest@example.com", "loadtest"
+        admin = User()
+        admin.email = email
+        admin.password = password
+        admin.save()
+
+        def make_client():
+            return TestClient(app)
+
+    token = base64.b64encode(
+        "{}:{}".format(email, password).encode()).decode()
+    auth = {"Authorization": "Basic " + token}
+
+    seed_client = make_client()
+    user_ids = []
+    for i in range(options.users):
+        status, body = seed_client.request(
+            "POST", "/api/v1/users", headers=auth,
+            json={"email": "seed-{}-{}@example.com".format(i, time.time()),
+                  "password": "pwd"})
+        if status == 201:
+            user_ids.append(body["id"])
+
+    lock = threading.Lock()
+    per_worker = options.requests // options.concurrency
+    workers = [Worker(make_client(), auth, user_ids, lock, per_worker,
+                      options.seed + i)
+               for i in range(options.concurrency)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    samples = {op: [] for op in MIX}
+    for worker in workers:
+        for op, entries in worker.samples.items():
+            samples[op].extend(entries)
+    report = summarize(samples, elapsed)
+    report["concurrency"] = options.concurrency
+    report["target"] = options.url or "test_client"
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=None,
+                        help="base URL of a running server, e.g. "
+                             "http://localhost:5000 (default: in-process)")
+    parser.add_argument("--email", default=None,
+                        help="existing user to authenticate with (--url)")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="total number of requests")
+    parser.add_argument("--users", type=int, default=100,
+                        help="users created before the run")
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+    if options.url and not (options.email and options.password):
+        parser.error("--url needs --email and --password")
+
+    json.dump(main(options), sys.stdout, indent=2)
+    sys.stdout.write("\n")
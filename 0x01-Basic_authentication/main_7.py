@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+""" Main 7: a worker sees the saves another worker appends to the write
+log after a compaction (indexes, listeners and the lazy-load index)
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+os.environ.update(DB_STORAGE="append", DB_COMPACT_EVERY="2",
+                  DB_SYNC_INTERVAL="0", DB_LAZY_LOAD="1")
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, here)
+os.chdir(tempfile.mkdtemp())
+
+from models import base
+from models.user import User
+
+
+def other_worker(code: str):
+    """ Run code in another process sharing the store """
+    subprocess.run([sys.executable, "-c",
+                    "from models.user import User\n" + code],
+                   env=dict(os.environ, PYTHONPATH=here), check=True)
+
+
+seen = []
+base.LISTENERS.append(lambda obj, op: seen.append((obj.email, op)))
+
+for email in ("a@a", "b@b"):
+    user = User()
+    user.email = email
+    user.save()
+print("Compacted: {}".format(not os.path.exists(".db_User.log")))
+
+other_worker("user = User()\nuser.email = 'x@x'\nuser.save()")
+print("Found x@x: {}".format(len(User.search({'email': "x@x"})) == 1))
+print("Count: {}".format(User.count()))
+print("Listener notified: {}".format(("x@x", "save") in seen))
+
+duplicate = User()
+duplicate.email = "x@x"
+try:
+    duplicate.save()
+    print("Duplicate saved")
+except ValueError as e:
+    print("Duplicate rejected: {}".format(e))
+
+# Compact with x@x in memory, then load lazily in another process
+user = User()
+user.email = "c@c"
+user.save()
+other_worker("assert len(User.search({'email': 'x@x'})) == 1\n"
+             "print('Lazy worker finds x@x: True')")
@@ -2,20 +2,78 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from typing import TypeVar, Dict, List, Iterable, Iterator, Tuple
+from os import getenv, path
+import os
+import threading
+import time
 import uuid
 
+from models import codec
+from models.codec import (TIMESTAMP_FORMAT, format_epoch, format_timestamp,
+                          from_epoch, parse_epoch, parse_timestamp, to_epoch)
+from models.lazy_store import (LazyObjects, read_index, scan_snapshot,
+                               write_index)
+from models.locking import FileLock, RWLock
+
 
-TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+# Callables invoked as callback(obj, op) after an object is saved
+# ("save") or removed ("remove")
+LISTENERS = []
+
+# "snapshot" rewrites the whole file on every write, "append" logs each
+# write to .db_<class>.log and compacts into the snapshot periodically
+STORAGE_MODE = getenv("DB_STORAGE", "snapshot")
+COMPACT_EVERY = int(getenv("DB_COMPACT_EVERY", "1000"))
+LOG_ENTRIES = {}
+
+# Lazy loading maps the snapshot and decodes objects on first lookup,
+# using the offset index written next to it (.db_<class>.json.idx);
+# warm-up materializes everything in a background thread
+LAZY_LOAD = getenv("DB_LAZY_LOAD", "0") == "1"
+WARM_UP = getenv("DB_WARM_UP", "0") == "1"
+
+# Reads take a per-class RWLock; writes also hold .db_<class>.lock so
+# workers don't interleave. Every SYNC_INTERVAL seconds at most, reads
+# check whether another worker changed the files and reload if so.
+SYNC_INTERVAL = float(getenv("DB_SYNC_INTERVAL", "0.5"))
+LOCKS = {}
+FILE_STATES = {}
+LOG_OFFSETS = {}
+LAST_SYNC = {}
+# Storage order of each class for cursor pagination: [IDs in order,
+# with None where removed; position of each ID; number removed]. Built
+# on first use, then kept up to date by writes.
+ORDERS = {}
+_LOCKS_LOCK = threading.Lock()
 
 
 class Base():
     """ Base class
+
+    Instances use __slots__ instead of a __dict__: subclasses declare
+    their attributes in __slots__ and to_json serializes them in
+    declaration order. Slots listed in _codecs hold a compact form of
+    their value: timestamps are seconds since the epoch (floats).
     """
 
+    __slots__ = ('id', '_created_at', '_updated_at')
+
+    # Slots holding the value of a property, mapped to the property name
+    _aliases = {'_created_at': 'created_at', '_updated_at': 'updated_at'}
+
+    # Slots stored in a compact form, mapped to the functions converting
+    # their JSON value to it and back
+    _codecs = {'_created_at': (parse_epoch, format_epoch),
+               '_updated_at': (parse_epoch, format_epoch)}
+
+    # Attributes with a secondary index, mapped to whether the index is
+    # unique. Indexes reflect the saved state of objects.
+    _indexes = {}
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
@@ -24,16 +82,102 @@ class Base():
             DATA[s_class] = {}
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.updated_at = datetime.utcnow()
+        now = datetime.utcnow()
+        self.created_at = kwargs.get('created_at') or now
+        self.updated_at = kwargs.get('updated_at') or now
+
+    @staticmethod
+    def _to_datetime(value) -> datetime:
+        """ datetime of a timestamp slot value
+        """
+        if type(value) is float:
+            return from_epoch(value)
+        # Not a valid timestamp when loaded: fails here, as it did
+        # when timestamps were parsed on first access
+        return parse_timestamp(value)
+
+    @staticmethod
+    def _from_datetime(value) -> float:
+        """ Timestamp slot value of a datetime or a stored timestamp
+        """
+        if type(value) is str:
+            return parse_epoch(value)
+        return to_epoch(value)
+
+    @property
+    def created_at(self) -> datetime:
+        """ Creation time
+        """
+        return self._to_datetime(self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """ Setter of the creation time
+        """
+        self._created_at = self._from_datetime(value)
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Update time
+        """
+        return self._to_datetime(self._updated_at)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """ Setter of the update time
+        """
+        self._updated_at = self._from_datetime(value)
+
+    @classmethod
+    def _fields(cls) -> Tuple[Tuple[str, str], ...]:
+        """ (slot, JSON key) of the slots of the class and its parents,
+        in declaration order
+        """
+        fields = cls.__dict__.get('_slot_fields')
+        if fields is None:
+            fields = tuple((name, cls._aliases.get(name, name))
+                           for klass in reversed(cls.__mro__)
+                           for name in klass.__dict__.get('__slots__', ())
+                           if name not in ('__dict__', '__weakref__'))
+            cls._slot_fields = fields
+        return fields
+
+    @classmethod
+    def _decoders(cls) -> Tuple[Tuple[str, str, object], ...]:
+        """ (slot, JSON key, decoder or None) of the fields of the class
+        """
+        decoders = cls.__dict__.get('_slot_decoders')
+        if decoders is None:
+            decoders = tuple((slot, key, cls._codecs.get(slot, (None,))[0])
+                             for slot, key in cls._fields())
+            cls._slot_decoders = decoders
+        return decoders
+
+    @classmethod
+    def from_json_bulk(cls, objs_json: Iterable[dict]) -> Dict[str, 'Base']:
+        """ Build objects from their JSON form, keyed by ID
+
+        Fills the slots directly instead of running __init__ per object,
+        so it only suits classes whose __init__ copies keyword arguments
+        into slots, as Base and User do.
+        """
+        objs = {}
+        for obj_json in objs_json:
+            obj = cls.from_json(obj_json)
+            objs[obj.id] = obj
+        return objs
+
+    @classmethod
+    def from_json(cls, obj_json: dict) -> 'Base':
+        """ Build one object from its JSON form (see from_json_bulk)
+        """
+        obj = cls.__new__(cls)
+        for slot, key, decode in cls._decoders():
+            value = obj_json.get(key)
+            if decode is not None and value is not None:
+                value = decode(value)
+            setattr(obj, slot, value)
+        return obj
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -48,65 +192,468 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        codecs = self._codecs
+        items = [(key, getattr(self, slot) if slot not in codecs
+                  else codecs[slot][1](getattr(self, slot)))
+                 for slot, key in self._fields()]
+        items.extend(getattr(self, '__dict__', {}).items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+                result[key] = format_timestamp(value)
             else:
                 result[key] = value
         return result
 
+    @classmethod
+    def _locks(cls) -> Tuple[RWLock, FileLock]:
+        """ In-process and cross-process locks of the class
+        """
+        s_class = cls.__name__
+        locks = LOCKS.get(s_class)
+        if locks is None:
+            with _LOCKS_LOCK:
+                locks = LOCKS.get(s_class)
+                if locks is None:
+                    locks = (RWLock(),
+                             FileLock(".db_{}.lock".format(s_class)))
+                    LOCKS[s_class] = locks
+        return locks
+
+    @classmethod
+    def _file_state(cls) -> Tuple[int, int, int]:
+        """ (inode, size, mtime) of the snapshot, None if missing
+        """
+        try:
+            stat = os.stat(".db_{}.json".format(cls.__name__))
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def _log_size(cls) -> int:
+        """ Size of the write log, 0 if missing
+        """
+        try:
+            return os.path.getsize(".db_{}.log".format(cls.__name__))
+        except OSError:
+            return 0
+
+    @classmethod
+    def _sync(cls):
+        """ Reload changes made by other workers, checking the files at
+        most every SYNC_INTERVAL seconds
+        """
+        s_class = cls.__name__
+        now = time.monotonic()
+        if now - LAST_SYNC.get(s_class, -SYNC_INTERVAL) < SYNC_INTERVAL:
+            return
+        LAST_SYNC[s_class] = now
+        if s_class in FILE_STATES and \
+                cls._file_state() == FILE_STATES[s_class] and \
+                cls._log_size() == LOG_OFFSETS.get(s_class, 0):
+            return
+        rw_lock, file_lock = cls._locks()
+        with rw_lock.write(), file_lock:
+            cls._refresh()
+
+    @classmethod
+    def _refresh(cls):
+        """ Bring DATA up to date with the files (locks must be held):
+        reload everything if the snapshot changed, else apply the log
+        entries appended since the last check
+        """
+        s_class = cls.__name__
+        LAST_SYNC[s_class] = time.monotonic()
+        if s_class not in FILE_STATES or \
+                cls._file_state() != FILE_STATES[s_class]:
+            cls._load()
+            return
+        offset = LOG_OFFSETS.get(s_class, 0)
+        size = cls._log_size()
+        if size < offset:
+            cls._load()
+        elif size > offset:
+            LOG_OFFSETS[s_class] = cls._replay_log(offset, incremental=True)
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the write log
+        """
+        rw_lock, file_lock = cls._locks()
+        with rw_lock.write(), file_lock:
+            cls._load()
+
+    @classmethod
+    def _load(cls):
+        """ Body of load_from_file (locks must be held)
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
-        if not path.exists(file_path):
+        ORDERS.pop(s_class, None)
+        if path.exists(file_path):
+            index = read_index(file_path) if LAZY_LOAD else None
+            if index is not None:
+                DATA[s_class] = LazyObjects(file_path, index, cls.from_json)
+            else:
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+                DATA[s_class] = cls.from_json_bulk(codec.loads(data).values())
+                if LAZY_LOAD:
+                    # Missing or stale index: write it, so the next
+                    # start is lazy
+                    cls._index_snapshot(file_path, data)
+        FILE_STATES[s_class] = cls._file_state()
+        LOG_OFFSETS[s_class] = cls._replay_log()
+        LAST_SYNC[s_class] = time.monotonic()
+        cls._reindex()
+        if WARM_UP and isinstance(DATA[s_class], LazyObjects):
+            threading.Thread(target=DATA[s_class].warm_up,
+                             daemon=True).start()
+
+    @classmethod
+    def _index_snapshot(cls, file_path: str, data: bytes):
+        """ Write the offset index of the snapshot data, just loaded
+        into DATA (locks must be held)
+        """
+        objs = DATA[cls.__name__]
+        attrs = list(cls._indexes)
+        try:
+            entries = [[obj_id, offset, length,
+                        [getattr(objs[obj_id], attr, None) for attr in attrs]]
+                       for obj_id, offset, length in scan_snapshot(data)]
+        except (KeyError, ValueError):
+            # Not written by this store: the next snapshot will be
             return
+        write_index(file_path, attrs, entries)
+
+    @classmethod
+    def _replay_log(cls, offset: int = 0, incremental: bool = False) -> int:
+        """ Apply the entries of the write log from offset on top of DATA
+        and return the offset reached
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        On a full load the indexes are left to _reindex; incrementally,
+        they are updated and listeners notified entry by entry. The
+        offset alone doesn't tell: after a compaction, entries appended
+        by other workers start again at offset 0.
+        """
+        s_class = cls.__name__
+        log_path = ".db_{}.log".format(s_class)
+        if not incremental:
+            LOG_ENTRIES[s_class] = 0
+        if not path.exists(log_path):
+            return 0
+
+        objs = DATA[s_class]
+        with open(log_path, 'rb+') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Incomplete log entry")
+                    entry = codec.loads(line)
+                except ValueError:
+                    # Torn last line of a write interrupted by a crash:
+                    # drop it so the next append starts on a fresh line
+                    f.truncate(offset)
+                    break
+                offset += len(line)
+                LOG_ENTRIES[s_class] = LOG_ENTRIES.get(s_class, 0) + 1
+                if entry["op"] == "save":
+                    obj = cls.from_json(entry["obj"])
+                    objs[obj.id] = obj
+                    cls._track(obj.id, True)
+                    if incremental:
+                        obj._index(check=False)
+                        obj._notify("save")
+                else:
+                    obj = objs.pop(entry["id"], None)
+                    cls._track(entry["id"], False)
+                    if incremental and obj is not None:
+                        obj._unindex()
+                        obj._notify("remove")
+        return offset
+
+    @classmethod
+    def _append_to_log(cls, *entries: dict):
+        """ Durably append entries to the write log in one write,
+        compacting the log into the snapshot every COMPACT_EVERY entries
+        """
+        s_class = cls.__name__
+        log_path = ".db_{}.log".format(s_class)
+        with open(log_path, 'ab') as f:
+            f.write(b"".join(codec.dumps(entry) + b"\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+            LOG_OFFSETS[s_class] = f.tell()
+        LOG_ENTRIES[s_class] = LOG_ENTRIES.get(s_class, 0) + len(entries)
+        if LOG_ENTRIES[s_class] >= COMPACT_EVERY:
+            cls.compact()
+
+    @classmethod
+    def compact(cls):
+        """ Write a full snapshot and truncate the write log
+        """
+        s_class = cls.__name__
+        rw_lock, file_lock = cls._locks()
+        with rw_lock.write(), file_lock:
+            cls.save_to_file()
+            log_path = ".db_{}.log".format(s_class)
+            if path.exists(log_path):
+                os.remove(log_path)
+            LOG_ENTRIES[s_class] = 0
+            LOG_OFFSETS[s_class] = 0
+
+    @classmethod
+    def _order(cls) -> list:
+        """ Return the storage order of the class (see ORDERS), building
+        it from DATA if needed (a lock must be held)
+        """
+        s_class = cls.__name__
+        order = ORDERS.get(s_class)
+        if order is None:
+            ids = list(DATA.get(s_class, {}))
+            order = [ids, {obj_id: i for i, obj_id in enumerate(ids)}, 0]
+            ORDERS[s_class] = order
+        return order
+
+    @classmethod
+    def _track(cls, obj_id: str, stored: bool):
+        """ Record in the storage order that obj_id was stored or removed
+        (the write lock must be held)
+
+        Like a dict, a new ID goes last and a saved one keeps its place.
+        A removed ID keeps its position, so a cursor on it still works,
+        until removed IDs make up half of the order and it is rebuilt.
+        """
+        s_class = cls.__name__
+        order = ORDERS.get(s_class)
+        if order is None:
+            return
+        ids, positions = order[0], order[1]
+        position = positions.get(obj_id)
+        if stored:
+            if position is None or ids[position] is None:
+                # A stale slot of a removed ID stays a hole in ids
+                positions[obj_id] = len(ids)
+                ids.append(obj_id)
+        elif position is not None and ids[position] is not None:
+            ids[position] = None
+            order[2] += 1
+            if order[2] * 2 > len(ids):
+                del ORDERS[s_class]
+
+    @classmethod
+    def _reindex(cls):
+        """ Rebuild every index of the class from DATA
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls._indexes}
+        INDEXED_VALUES[s_class] = {}
+        objs = DATA.get(s_class, {})
+        stored = {}
+        if isinstance(objs, LazyObjects) and \
+                list(objs.attrs) == list(cls._indexes):
+            # Objects still on disk are indexed from the offset index
+            stored = objs.indexed_values()
+        for obj_id in objs:
+            values = stored.get(obj_id)
+            if values is None:
+                objs[obj_id]._index(check=False)
+            else:
+                cls._add_to_indexes(obj_id, values)
+
+    def _index(self, check: bool = True):
+        """ Add the object to the indexes of its class, replacing
+        the entries of its previous saved state
+        """
+        s_class = self.__class__.__name__
+        indexes = INDEXES.setdefault(
+            s_class, {attr: {} for attr in self._indexes})
+        values = {attr: getattr(self, attr, None) for attr in self._indexes}
+        if check:
+            # Only a value that changes is checked, so objects saved
+            # before an index became unique can still be updated
+            saved = INDEXED_VALUES.get(s_class, {}).get(self.id, {})
+            for attr, unique in self._indexes.items():
+                ids = indexes[attr].get(values[attr], ())
+                if unique and values[attr] is not None \
+                        and (attr not in saved
+                             or saved[attr] != values[attr]) \
+                        and any(i != self.id for i in ids):
+                    raise ValueError("{} {} already exists".format(
+                        attr, values[attr]))
+        self._unindex()
+        self.__class__._add_to_indexes(self.id, values)
+
+    @classmethod
+    def _add_to_indexes(cls, obj_id: str, values: dict):
+        """ Record the indexed attribute values of an object
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.setdefault(
+            s_class, {attr: {} for attr in cls._indexes})
+        for attr, value in values.items():
+            indexes[attr].setdefault(value, {})[obj_id] = None
+        INDEXED_VALUES.setdefault(s_class, {})[obj_id] = values
+
+    def _unindex(self):
+        """ Remove the object from the indexes of its class
+        """
+        s_class = self.__class__.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(self.id, None)
+        if values is None:
+            return
+        indexes = INDEXES[s_class]
+        for attr, value in values.items():
+            ids = indexes[attr].get(value)
+            if ids is not None:
+                ids.pop(self.id, None)
+                if not ids:
+                    del indexes[attr][value]
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
+        rw_lock, file_lock = cls._locks()
+        with rw_lock.write(), file_lock:
+            cls._write_snapshot()
+
+    @classmethod
+    def _write_snapshot(cls):
+        """ Body of save_to_file (locks must be held)
+        """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        objs = DATA[s_class]
+        lazy = isinstance(objs, LazyObjects)
+        attrs = list(cls._indexes)
+        indexed = INDEXED_VALUES.get(s_class, {})
+        entries = []
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        # Write aside then rename, so a crash never leaves a partial file.
+        # Objects are written one by one to record their offsets; those
+        # never loaded from a lazy snapshot are copied over as is.
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b"{")
+            offset = 1
+            for obj_id in objs:
+                body = objs.raw(obj_id) if lazy else None
+                if body is None:
+                    body = codec.dumps(objs[obj_id].to_json(True))
+                head = codec.dumps(obj_id) + b":"
+                if entries:
+                    head = b"," + head
+                f.write(head)
+                offset += len(head)
+                values = indexed.get(obj_id, {})
+                entries.append([obj_id, offset, len(body),
+                                [values.get(attr) for attr in attrs]])
+                f.write(body)
+                offset += len(body)
+            f.write(b"}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        FILE_STATES[s_class] = cls._file_state()
+        if LAZY_LOAD:
+            write_index(file_path, attrs, entries)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        error = self.__class__.save_many([self])[0]
+        if error is not None:
+            raise error
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        self.__class__.remove_many([self])
+
+    @classmethod
+    def save_many(cls, objs: List[TypeVar('Base')]) -> List[Exception]:
+        """ Save objects, writing to file once for all of them
+
+        Return one item per object: None if it was saved, else the
+        ValueError raised by a duplicate on a unique index.
+        """
+        s_class = cls.__name__
+        errors = []
+        saved = []
+        rw_lock, file_lock = cls._locks()
+        with rw_lock.write(), file_lock:
+            cls._refresh()
+            for obj in objs:
+                try:
+                    obj._index()
+                except ValueError as e:
+                    errors.append(e)
+                    continue
+                errors.append(None)
+                obj.updated_at = datetime.utcnow()
+                DATA[s_class][obj.id] = obj
+                cls._track(obj.id, True)
+                saved.append(obj)
+            if saved:
+                if STORAGE_MODE == "append":
+                    cls._append_to_log(*[
+                        {"op": "save", "obj": obj.to_json(True)}
+                        for obj in saved])
+                else:
+                    cls._write_snapshot()
+        for obj in saved:
+            obj._notify("save")
+        return errors
+
+    @classmethod
+    def remove_many(cls, objs: List[TypeVar('Base')]) -> List[bool]:
+        """ Remove objects, writing to file once for all of them
+
+        Return one item per object: whether it was stored.
+        """
+        s_class = cls.__name__
+        results = []
+        removed = []
+        rw_lock, file_lock = cls._locks()
+        with rw_lock.write(), file_lock:
+            cls._refresh()
+            for obj in objs:
+                results.append(DATA[s_class].get(obj.id) is not None)
+                if not results[-1]:
+                    continue
+                del DATA[s_class][obj.id]
+                cls._track(obj.id, False)
+                obj._unindex()
+                removed.append(obj)
+            if removed:
+                if STORAGE_MODE == "append":
+                    cls._append_to_log(*[{"op": "remove", "id": obj.id}
+                                         for obj in removed])
+                else:
+                    cls._write_snapshot()
+        for obj in removed:
+            obj._notify("remove")
+        return results
+
+    def _notify(self, op: str):
+        """ Call every registered listener about a change
+        """
+        for listener in LISTENERS:
+            listener(self, op)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        cls._sync()
+        with cls._locks()[0].read():
+            return len(DATA[s_class].keys())
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,18 +661,88 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def iterate(cls, after_id: str = None) -> Iterator[TypeVar('Base')]:
+        """ Return an iterator of the objects in storage order, starting
+        after the object with ID after_id when given
+
+        The start is found through the position index of the storage
+        order, so resuming from a cursor doesn't scan the earlier IDs.
+
+        Raises:
+            ValueError: If after_id is not a known ID.
+        """
+        s_class = cls.__name__
+        cls._sync()
+        rw_lock = cls._locks()[0]
+        with rw_lock.read():
+            objs = DATA[s_class]
+            ids, positions = cls._order()[:2]
+            start = 0
+            if after_id is not None:
+                if after_id not in positions:
+                    raise ValueError("Unknown ID {}".format(after_id))
+                start = positions[after_id] + 1
+        return cls._iterate(rw_lock, objs, ids, start)
+
+    @staticmethod
+    def _iterate(rw_lock: RWLock, objs: dict, ids: List[str],
+                 start: int) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects of ids from position start on, holding the
+        read lock for one lookup at a time
+        """
+        position = start
+        while True:
+            with rw_lock.read():
+                if position >= len(ids):
+                    return
+                obj_id = ids[position]
+                obj = objs.get(obj_id) if obj_id is not None else None
+            position += 1
+            if obj is not None:
+                yield obj
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        cls._sync()
+        with cls._locks()[0].read():
+            return DATA[s_class].get(id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Exact matches on an indexed attribute are answered from the
+        index; other attributes are checked on the candidates only.
         """
         s_class = cls.__name__
+        cls._sync()
+        with cls._locks()[0].read():
+            return cls._search(attributes)
+
+    @classmethod
+    def _search(cls, attributes: dict) -> List[TypeVar('Base')]:
+        """ Body of search (read lock must be held)
+        """
+        s_class = cls.__name__
+        candidates = None
+        for k, v in attributes.items():
+            index = INDEXES.get(s_class, {}).get(k)
+            if index is None:
+                continue
+            try:
+                ids = index.get(v, ())
+            except TypeError:
+                continue
+            objs = DATA[s_class]
+            candidates = [objs[i] for i in ids if i in objs]
+            break
+        if candidates is None:
+            candidates = DATA[s_class].values()
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +750,5 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        return list(filter(_search, candidates))
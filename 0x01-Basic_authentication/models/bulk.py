@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+""" Bulk module: create, update and delete users from NDJSON streams
+"""
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from models import codec
+from models.user import User
+
+
+BATCH_SIZE = 1000
+OPERATIONS = ("create", "update", "delete")
+
+
+def parse_ndjson(lines: Iterable) -> Iterator[Tuple[int, Optional[dict]]]:
+    """ Yield (line number, JSON object or None if invalid) for each
+    non-blank line of an NDJSON stream (str or bytes lines)
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = codec.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def _optional_str(row: dict, key: str) -> Optional[str]:
+    """ Value of key in row, which must be a string when present
+    """
+    value = row.get(key)
+    if value is not None and type(value) is not str:
+        raise ValueError("{} must be a string".format(key))
+    return value
+
+
+def _build(row: dict, restore: bool) -> User:
+    """ New User from a create row
+    """
+    email = _optional_str(row, "email")
+    password = _optional_str(row, "password")
+    hashed = _optional_str(row, "_password") if restore else None
+    if not email:
+        raise ValueError("email missing")
+    if not password and not hashed:
+        raise ValueError("password missing")
+    kwargs = {}
+    for key in ("id", "created_at") if restore else ():
+        if row.get(key) is not None:
+            kwargs[key] = _optional_str(row, key)
+    user = User(**kwargs)
+    user.email = email
+    if password:
+        user.password = password
+    else:
+        # Already hashed, as exported with export_users
+        user.set_password_hash(hashed)
+    user.first_name = _optional_str(row, "first_name")
+    user.last_name = _optional_str(row, "last_name")
+    return user
+
+
+def _lookup(row: dict) -> User:
+    """ Stored User targeted by an update or delete row
+    """
+    user_id = _optional_str(row, "id")
+    if not user_id:
+        raise ValueError("id missing")
+    user = User.get(user_id)
+    if user is None:
+        raise ValueError("User {} not found".format(user_id))
+    return user
+
+
+def _update(row: dict) -> User:
+    """ Stored User with the names of an update row applied
+    """
+    first_name = _optional_str(row, "first_name")
+    last_name = _optional_str(row, "last_name")
+    user = _lookup(row)
+    if first_name is not None:
+        user.first_name = first_name
+    if last_name is not None:
+        user.last_name = last_name
+    return user
+
+
+def _apply(op: str, rows: List[Tuple[int, Optional[dict]]],
+           restore: bool) -> List[dict]:
+    """ Apply op to one batch of rows and return their results
+    """
+    results = []
+    users = []
+    ids = set()
+    for number, row in rows:
+        result = {"line": number}
+        results.append(result)
+        if row is None:
+            result["error"] = "Wrong format"
+            continue
+        try:
+            if op == "create":
+                user = _build(row, restore)
+                if user.id in ids or User.get(user.id) is not None:
+                    raise ValueError("User {} already exists".format(user.id))
+                ids.add(user.id)
+            elif op == "update":
+                user = _update(row)
+            else:
+                user = _lookup(row)
+        except ValueError as e:
+            result["error"] = str(e)
+            continue
+        result["id"] = user.id
+        users.append((result, user))
+
+    if op == "delete":
+        removed = User.remove_many([user for _, user in users])
+        for (result, _), ok in zip(users, removed):
+            if ok:
+                result["status"] = "deleted"
+            else:
+                result["error"] = "User {} not found".format(result["id"])
+    else:
+        errors = User.save_many([user for _, user in users])
+        status = "created" if op == "create" else "updated"
+        for (result, _), error in zip(users, errors):
+            if error is None:
+                result["status"] = status
+            else:
+                result["error"] = "Can't {} User: {}".format(op, error)
+    return results
+
+
+def apply_rows(op: str, rows: Iterable[Tuple[int, Optional[dict]]],
+               batch_size: int = BATCH_SIZE,
+               restore: bool = False) -> Iterator[dict]:
+    """ Create, update or delete users from (line number, row) pairs
+
+    Rows are validated one by one, and each batch of batch_size rows is
+    written to file once. Yield one result per row, in order:
+    {"line", "id", "status"} on success, {"line", "error"} (and "id" if
+    known) on failure.
+
+    Rows:
+      - create: email, password, and optionally first_name, last_name;
+        with restore, also id, created_at and _password (the hashed
+        password, replacing password) as written by export_users
+      - update: id, and optionally first_name, last_name
+      - delete: id
+    """
+    if op not in OPERATIONS:
+        raise ValueError("op must be one of {}".format(", ".join(OPERATIONS)))
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield from _apply(op, batch, restore)
+
+
+def export_users(after_id: str = None) -> Iterator[bytes]:
+    """ Yield every user as an NDJSON line, with its hashed password so
+    the output can be imported back with the create operation
+    """
+    for user in User.iterate(after_id):
+        yield codec.dumps(user.to_json(True)) + b"\n"
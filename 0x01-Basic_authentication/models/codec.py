@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+""" Codec module: JSON and timestamp (de)serialization of the store
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, BinaryIO
+
+try:
+    import orjson as _backend
+    BACKEND = "orjson"
+except ImportError:
+    try:
+        import ujson as _backend
+        BACKEND = "ujson"
+    except ImportError:
+        import json as _backend
+        BACKEND = "json"
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def loads(data) -> Any:
+    """ Decode a JSON document from str or bytes
+    """
+    return _backend.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """ Encode an object as a UTF-8 JSON document
+    """
+    data = _backend.dumps(obj)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return data
+
+
+def load(f: BinaryIO) -> Any:
+    """ Decode the JSON document of a binary file
+    """
+    return loads(f.read())
+
+
+def dump(obj: Any, f: BinaryIO):
+    """ Encode an object as JSON into a binary file
+    """
+    f.write(dumps(obj))
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a "YYYY-MM-DDTHH:MM:SS" timestamp
+
+    Slices the fixed-width fields instead of running strptime, which
+    remains the fallback for anything else. datetime objects are
+    immutable, so equal timestamps share one (cached) instance.
+    """
+    if len(value) == 19 and value[4] == '-' and value[10] == 'T':
+        try:
+            return datetime(int(value[0:4]), int(value[5:7]),
+                            int(value[8:10]), int(value[11:13]),
+                            int(value[14:16]), int(value[17:19]))
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    """ Format a datetime as a "YYYY-MM-DDTHH:MM:SS" timestamp
+    """
+    return "%04d-%02d-%02dT%02d:%02d:%02d" % (
+        value.year, value.month, value.day,
+        value.hour, value.minute, value.second)
+
+
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+
+
+def to_epoch(value: datetime) -> float:
+    """ Seconds since the epoch of a naive UTC datetime
+    """
+    return (value - EPOCH) / SECOND
+
+
+def from_epoch(value: float) -> datetime:
+    """ Naive UTC datetime of seconds since the epoch
+    """
+    return EPOCH + timedelta(seconds=value)
+
+
+def parse_epoch(value: str):
+    """ Seconds since the epoch of a stored timestamp, or the string
+    itself if it isn't one (so a bad value fails on access, not load)
+
+    A float takes 24 bytes where the 19-character string takes 68.
+    """
+    try:
+        return to_epoch(parse_timestamp(value))
+    except (TypeError, ValueError):
+        return value
+
+
+def format_epoch(value) -> str:
+    """ Stored form of seconds since the epoch (see parse_epoch)
+    """
+    if type(value) is float:
+        return format_timestamp(from_epoch(value))
+    return value
+
+
+def pack_hex(value: str):
+    """ Bytes of a lowercase hex string, or the value itself if it isn't
+    one, so that pack_hex and unpack_hex round-trip exactly
+
+    A 32-byte digest takes 65 bytes where its hex string takes 113.
+    """
+    if type(value) is not str:
+        return value
+    try:
+        data = bytes.fromhex(value)
+    except ValueError:
+        return value
+    return data if data.hex() == value else value
+
+
+def unpack_hex(value) -> str:
+    """ Hex string of bytes packed by pack_hex
+    """
+    return value.hex() if type(value) is bytes else value
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+""" Lazy store module: objects materialized from a memory-mapped snapshot
+"""
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import mmap
+import os
+import re
+import threading
+
+from models import codec
+
+
+def index_path(file_path: str) -> str:
+    """ Path of the offset index written next to a snapshot
+    """
+    return file_path + ".idx"
+
+
+def write_index(file_path: str, attrs: List[str], entries: list):
+    """ Write the offset index of a snapshot
+
+    entries holds one [id, offset, length, [indexed values]] per object,
+    indexed values following the order of attrs.
+    """
+    stat = os.stat(file_path)
+    tmp_path = index_path(file_path) + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        codec.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                    "attrs": attrs, "entries": entries}, f)
+    os.replace(tmp_path, index_path(file_path))
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def scan_snapshot(data: bytes) -> Iterator[Tuple[str, int, int]]:
+    """ Yield (id, offset, length) of each object of a snapshot, in file
+    order, whatever its JSON formatting
+
+    Raises:
+        ValueError: If data is not a JSON object.
+    """
+    # Latin-1 maps each byte to one character, so string positions are
+    # byte offsets; only the structure is read from it
+    text = data.decode('latin-1')
+    decoder = json.JSONDecoder()
+
+    def skip(pos: int, expected: str = None) -> int:
+        """ Position after whitespace, and after expected if given """
+        pos = _WHITESPACE.match(text, pos).end()
+        if expected is None:
+            return pos
+        if text[pos:pos + 1] != expected:
+            raise ValueError("Expected {!r} at {}".format(expected, pos))
+        return _WHITESPACE.match(text, pos + 1).end()
+
+    pos = skip(0, '{')
+    if text[pos:pos + 1] == '}':
+        return
+    while True:
+        _, key_end = decoder.raw_decode(text, pos)
+        obj_id = codec.loads(data[pos:key_end])
+        pos = skip(key_end, ':')
+        _, end = decoder.raw_decode(text, pos)
+        yield obj_id, pos, end - pos
+        pos = skip(end)
+        if text[pos:pos + 1] == '}':
+            return
+        pos = skip(pos, ',')
+
+
+def read_index(file_path: str) -> Optional[dict]:
+    """ Read the offset index of a snapshot, or None if it is missing
+    or was not written for the current snapshot
+    """
+    try:
+        with open(index_path(file_path), 'rb') as f:
+            index = codec.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+    if index.get("size") != stat.st_size or \
+            index.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return index
+
+
+class LazyObjects(MutableMapping):
+    """ Mapping of ID to object backed by a memory-mapped snapshot
+
+    Only the offset index is read up front; each object is decoded the
+    first time it is looked up. Objects saved afterwards live in memory
+    like in a plain dict, and iteration keeps the snapshot order.
+    """
+
+    def __init__(self, file_path: str, index: dict,
+                 build: Callable[[dict], object]):
+        """ Map the snapshot and register the objects of its index
+        """
+        self._build = build
+        self._lock = threading.Lock()
+        self._objs = {}
+        self._offsets = {}
+        self._values = {}
+        self.attrs = index["attrs"]
+        with open(file_path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if index["size"] else b""
+        for obj_id, offset, length, values in index["entries"]:
+            self._objs[obj_id] = None
+            self._offsets[obj_id] = (offset, length)
+            self._values[obj_id] = values
+
+    def __getitem__(self, obj_id: str):
+        obj = self._objs[obj_id]
+        if obj is None:
+            with self._lock:
+                obj = self._objs[obj_id]
+                if obj is None:
+                    offset, length = self._offsets.pop(obj_id)
+                    obj = self._build(
+                        codec.loads(self._mm[offset:offset + length]))
+                    self._objs[obj_id] = obj
+        return obj
+
+    def __setitem__(self, obj_id: str, obj):
+        with self._lock:
+            self._objs[obj_id] = obj
+            self._offsets.pop(obj_id, None)
+
+    def __delitem__(self, obj_id: str):
+        with self._lock:
+            del self._objs[obj_id]
+            self._offsets.pop(obj_id, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._objs)
+
+    def __len__(self) -> int:
+        return len(self._objs)
+
+    def __contains__(self, obj_id) -> bool:
+        return obj_id in self._objs
+
+    def indexed_values(self) -> Dict[str, Dict]:
+        """ Return {ID: {attr: value}} of the objects not materialized
+        yet, as recorded in the offset index, and forget them
+        """
+        values, self._values = self._values, {}
+        return {obj_id: dict(zip(self.attrs, obj_values))
+                for obj_id, obj_values in values.items()
+                if obj_id in self._offsets}
+
+    def raw(self, obj_id: str) -> Optional[bytes]:
+        """ JSON of an object not materialized yet, None otherwise
+        """
+        location = self._offsets.get(obj_id)
+        if location is None:
+            return None
+        offset, length = location
+        return self._mm[offset:offset + length]
+
+    def pending(self) -> int:
+        """ Number of objects not materialized yet
+        """
+        return len(self._offsets)
+
+    def warm_up(self):
+        """ Materialize every object
+        """
+        for obj_id in list(self._objs):
+            try:
+                self[obj_id]
+            except KeyError:
+                pass
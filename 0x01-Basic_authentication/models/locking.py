@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+""" Locking module: in-process read/write locks and cross-process file locks
+"""
+from contextlib import contextmanager
+from typing import Iterator
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class RWLock():
+    """ Readers/writer lock
+
+    Any number of threads may read at once; a writer waits for readers
+    to leave and holds the lock alone. Waiting writers go before new
+    readers. Both sides are reentrant, and the writer may also read.
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked RWLock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._depth = 0
+        self._waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Hold the lock for reading
+        """
+        me = threading.get_ident()
+        reads = getattr(self._local, 'reads', 0)
+        if self._writer == me or reads:
+            self._local.reads = reads + 1
+            try:
+                yield
+            finally:
+                self._local.reads = reads
+            return
+
+        with self._cond:
+            while self._writer is not None or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        self._local.reads = 1
+        try:
+            yield
+        finally:
+            self._local.reads = 0
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Hold the lock for writing
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting -= 1
+                self._writer = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class FileLock():
+    """ Exclusive lock shared by every process using the same lock file
+
+    Uses flock(2) where available; threads of one process are
+    serialized by a reentrant lock since flock is per open file.
+    """
+
+    def __init__(self, file_path: str):
+        """ Initialize a FileLock on file_path (created when needed)
+        """
+        self.file_path = file_path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self) -> 'FileLock':
+        self._lock.acquire()
+        self._depth += 1
+        if self._depth == 1 and fcntl is not None:
+            try:
+                self._file = open(self.file_path, 'a')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                self._release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self._release()
+
+    def _release(self):
+        """ Undo one level of __enter__
+        """
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
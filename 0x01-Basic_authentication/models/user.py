@@ -3,26 +3,35 @@
 """
 import hashlib
 from models.base import Base
+from models.codec import pack_hex, unpack_hex
 
 
 class User(Base):
     """ User class
+
+    The password hash is kept as the bytes of its hex digest.
     """
 
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+
+    _indexes = {'email': True}
+
+    _codecs = dict(Base._codecs, _password=(pack_hex, unpack_hex))
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
         super().__init__(*args, **kwargs)
         self.email = kwargs.get('email')
-        self._password = kwargs.get('_password')
+        self._password = pack_hex(kwargs.get('_password'))
         self.first_name = kwargs.get('first_name')
         self.last_name = kwargs.get('last_name')
 
     @property
     def password(self) -> str:
-        """ Getter of the password
+        """ Getter of the password hash, in hex
         """
-        return self._password
+        return unpack_hex(self._password)
 
     @password.setter
     def password(self, pwd: str):
@@ -31,7 +40,7 @@ class User(Base):
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = hashlib.sha256(pwd.encode()).digest()
 
     def is_valid_password(self, pwd: str) -> bool:
         """ Validate a password
@@ -41,8 +50,15 @@ class User(Base):
         if self.password is None:
             return False
         pwd_e = pwd.encode()
+        if type(self._password) is bytes:
+            return hashlib.sha256(pwd_e).digest() == self._password
         return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
 
+    def set_password_hash(self, hashed: str):
+        """ Setter of the password hash, in hex (as exported)
+        """
+        self._password = pack_hex(hashed)
+
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
         """
@@ -10,6 +10,12 @@ app = Flask(__name__)
 AUTH = Auth()
 
 
+@app.teardown_appcontext
+def end_request(exception) -> None:
+    """Release the database session of the request."""
+    AUTH.end_request()
+
+
 @app.route('/users', methods=['POST'])
 def users():
     """Endpoint to register a new user."""
@@ -55,7 +61,7 @@ def logout():
     if not user:
         abort(403)
 
-    AUTH.destroy_session(user.id)
+    AUTH.destroy_session(user.id, session_id)
     return redirect('/')
 
 
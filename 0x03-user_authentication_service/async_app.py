@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+ASGI (Quart) app for user authentication service.
+
+Same routes and responses as app.py; serve it with an ASGI server:
+    hypercorn async_app:app --bind 0.0.0.0:5000
+Requires quart, sqlalchemy[asyncio] and aiosqlite; BCRYPT_WORKERS sizes
+the bcrypt thread pool (see async_auth).
+"""
+
+from quart import Quart, request, jsonify, redirect, abort
+from async_auth import AsyncAuth
+
+app = Quart(__name__)
+AUTH = AsyncAuth()
+
+
+@app.before_serving
+async def start() -> None:
+    """Create the database and session store."""
+    await AUTH.start()
+
+
+@app.after_serving
+async def stop() -> None:
+    """Release the pools."""
+    await AUTH.stop()
+
+
+@app.route('/users', methods=['POST'])
+async def users():
+    """Endpoint to register a new user."""
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+
+    try:
+        user = await AUTH.register_user(email, password)
+        response_data = {
+            "email": user.email,
+            "message": "user created"
+        }
+        return jsonify(response_data), 200
+    except ValueError:
+        return jsonify({"message": "email already registered"}), 400
+
+
+@app.route('/sessions', methods=['POST'])
+async def login():
+    """Endpoint to log in a user and create a session."""
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+
+    if not await AUTH.valid_login(email, password):
+        abort(401)
+
+    session_id = await AUTH.create_session(email)
+    response = jsonify({"email": email, "message": "logged in"})
+    response.set_cookie("session_id", session_id)
+    return response
+
+
+@app.route('/sessions', methods=['DELETE'])
+async def logout():
+    """Endpoint to log out a user and destroy a session."""
+    session_id = request.cookies.get('session_id')
+
+    if not session_id:
+        abort(403)
+
+    user = await AUTH.get_user_from_session_id(session_id)
+
+    if not user:
+        abort(403)
+
+    await AUTH.destroy_session(user.id, session_id)
+    return redirect('/')
+
+
+@app.route('/profile', methods=['GET'])
+async def profile():
+    """Endpoint to get the profile of a user."""
+    session_id = request.cookies.get('session_id')
+
+    if not session_id:
+        abort(403)
+
+    user = await AUTH.get_user_from_session_id(session_id)
+
+    if not user:
+        abort(403)
+
+    return jsonify({"email": user.email}), 200
+
+
+@app.route('/reset_password', methods=['POST'])
+async def get_reset_password_token():
+    """Endpoint to get a reset password token."""
+    email = (await request.form).get('email')
+
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+        return jsonify({"email": email, "reset_token": reset_token}), 200
+    except ValueError:
+        return jsonify({"message": "email not found"}), 403
+
+
+@app.route('/reset_password', methods=['PUT'])
+async def update_password():
+    """Endpoint to update the password using a reset token."""
+    form = await request.form
+    email = form.get('email')
+    reset_token = form.get('reset_token')
+    new_password = form.get('new_password')
+
+    try:
+        await AUTH.update_password(reset_token, new_password)
+        return jsonify({"email": email, "message": "Password updated"}), 200
+    except ValueError:
+        return jsonify({"message": "Invalid reset token"}), 403
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)
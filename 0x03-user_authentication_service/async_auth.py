@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Async auth module: the Auth flows as coroutines, for async_app.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, Union
+
+import bcrypt
+from sqlalchemy.orm.exc import NoResultFound
+
+from async_db import AsyncDB
+from async_session_store import get_async_session_store, sweep_forever
+from auth import _generate_uuid, _hash_password, _is_token
+from user import User
+
+
+class AsyncAuth:
+    """AsyncAuth class to interact with the authentication database
+    without blocking the event loop.
+
+    bcrypt runs in a bounded pool of BCRYPT_WORKERS threads (default:
+    the number of CPUs), so slow logins queue there instead of holding
+    the loop. Sessions are kept on the async engine of the database
+    (see get_async_session_store).
+    """
+
+    def __init__(self) -> None:
+        """Initialize the auth service; call start before use.
+        """
+        self._db = AsyncDB()
+        self._bcrypt = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BCRYPT_WORKERS", os.cpu_count() or 1)),
+            thread_name_prefix="bcrypt")
+        self._sessions = None
+        self._sweeper = None
+
+    async def start(self) -> None:
+        """Creates the tables and the session store.
+        """
+        await self._db.create_all()
+        self._sessions = get_async_session_store(self._db._engine)
+        self._sweeper = asyncio.create_task(sweep_forever(self._sessions))
+
+    async def stop(self) -> None:
+        """Stops the sweeper and releases the pools.
+        """
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self._sessions is not None:
+            await self._sessions.close()
+        self._bcrypt.shutdown(wait=False)
+        await self._db.dispose()
+
+    async def _hash(self, func: Callable, *args: Any) -> Any:
+        """Runs a bcrypt function in the bcrypt pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._bcrypt, partial(func, *args))
+
+    async def register_user(self, email: str, password: str) -> User:
+        """Registers a new user (see Auth.register_user).
+
+        Raises:
+            ValueError: If a user with the given email already exists.
+        """
+        try:
+            await self._db.find_user_by(email=email)
+            raise ValueError(f"User {email} already exists")
+        except NoResultFound:
+            pass
+        hashed_password = await self._hash(_hash_password, password)
+        return await self._db.add_user(email, hashed_password)
+
+    async def valid_login(self, email: str, password: str) -> bool:
+        """Validates login credentials (see Auth.valid_login).
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+        return await self._hash(bcrypt.checkpw, password.encode('utf-8'),
+                                user.hashed_password)
+
+    async def create_session(self, email: str) -> Union[str, None]:
+        """Creates a session ID for the user with the given email
+        (see Auth.create_session).
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return None
+        return await self._sessions.create(user.id)
+
+    async def get_user_from_session_id(
+            self, session_id: str) -> Union[User, None]:
+        """Finds and returns a user based on a session ID
+        (see Auth.get_user_from_session_id).
+        """
+        if session_id is None:
+            return None
+        session = await self._sessions.get(session_id)
+        if session is None:
+            return None
+        return await self._db.get_user(session.user_id)
+
+    async def destroy_session(self, user_id: int,
+                              session_id: Optional[str] = None) -> None:
+        """Destroys a session of the user with the given user ID
+        (see Auth.destroy_session).
+        """
+        if session_id is None:
+            await self._sessions.delete_user(user_id)
+        else:
+            await self._sessions.delete(session_id)
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """Generates a reset password token for the user with the given
+        email (see Auth.get_reset_password_token).
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        reset_token = _generate_uuid()
+        if await self._db.update_user_by({"email": email},
+                                         reset_token=reset_token) is None:
+            raise ValueError("User does not exist")
+        return reset_token
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """Updates a user's password using the reset token
+        (see Auth.update_password).
+
+        Raises:
+            ValueError: If the reset token is invalid.
+        """
+        if not _is_token(reset_token):
+            raise ValueError("Invalid reset token")
+        try:
+            await self._db.find_user_by(reset_token=reset_token)
+        except NoResultFound:
+            raise ValueError("Invalid reset token")
+        hashed_password = await self._hash(_hash_password, password)
+        user = await self._db.update_user_by(
+            {"reset_token": reset_token},
+            hashed_password=hashed_password,
+            reset_token=None
+        )
+        if user is None:
+            raise ValueError("Invalid reset token")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Async DB module: the DB class on SQLAlchemy's asyncio extension.
+
+Requires sqlalchemy[asyncio] (greenlet) and an async driver for the
+database, aiosqlite for SQLite.
+"""
+import os
+from typing import Any, Dict, Union
+
+from sqlalchemy import select
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import (AsyncEngine, async_sessionmaker,
+                                    create_async_engine)
+from sqlalchemy.orm.exc import NoResultFound
+
+from db import _configure_sqlite, _database_url, _engine_options, _user_update
+from user import Base, User
+
+# Async drivers of the backends whose default driver is synchronous
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def _async_database_url() -> URL:
+    """URL of the database with an async driver: ASYNC_DB_URL, or
+    DB_URL with its driver replaced
+    """
+    if os.getenv("ASYNC_DB_URL"):
+        return make_url(os.getenv("ASYNC_DB_URL"))
+    url = _database_url()
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    return url.set(drivername=driver) if driver else url
+
+
+def _create_async_engine() -> AsyncEngine:
+    """Create the async engine configured by the environment, with the
+    pool and SQLite settings of the synchronous one
+    """
+    url = _async_database_url()
+    engine = create_async_engine(url, echo=False, **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        _configure_sqlite(engine.sync_engine)
+    return engine
+
+
+class AsyncDB:
+    """AsyncDB class for interacting with the database from coroutines
+
+    Every method runs in a session of its own, so concurrent requests
+    never share one; returned users are detached with their attributes
+    loaded.
+    """
+
+    def __init__(self) -> None:
+        """Initialize a new AsyncDB instance; call create_all before use
+        """
+        self._engine = _create_async_engine()
+        self._sessionmaker = async_sessionmaker(self._engine,
+                                                expire_on_commit=False)
+
+    async def create_all(self) -> None:
+        """Recreate the tables, like DB does on initialization
+        """
+        async with self._engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def dispose(self) -> None:
+        """Close the connections of the pool
+        """
+        await self._engine.dispose()
+
+    async def add_user(self, email: str, hashed_password: str) -> User:
+        """Add a user to the database
+
+        Raises:
+            ValueError: If the email is already registered.
+        """
+        new_user = User(email=email, hashed_password=hashed_password)
+        async with self._sessionmaker() as session:
+            session.add(new_user)
+            try:
+                await session.commit()
+            except IntegrityError:
+                raise ValueError(f"User {email} already exists")
+        return new_user
+
+    async def find_user_by(self, **kwargs) -> User:
+        """Find a user by arbitrary keyword arguments
+
+        Raises:
+            NoResultFound: If no user matches.
+        """
+        async with self._sessionmaker() as session:
+            result = await session.scalars(select(User).filter_by(**kwargs))
+            user = result.first()
+        if user is None:
+            raise NoResultFound("No user found with the provided criteria")
+        return user
+
+    async def get_user(self, user_id: int) -> Union[User, None]:
+        """Find a user by primary key
+        """
+        async with self._sessionmaker() as session:
+            return await session.get(User, user_id)
+
+    async def update_user_by(self, criteria: Dict[str, Any],
+                             **kwargs) -> Union[User, None]:
+        """Update the user matching criteria with kwargs in a single
+        UPDATE ... WHERE statement and commit (see DB.update_user_by)
+        """
+        statement = _user_update(criteria, kwargs)
+        if statement is None:
+            return None
+        async with self._sessionmaker() as session:
+            if self._engine.dialect.update_returning:
+                result = await session.scalars(statement.returning(User))
+                user = result.first()
+            else:
+                user_id = (await session.scalars(
+                    select(User.id).filter_by(**criteria))).first()
+                user = None
+                if user_id is not None and (await session.execute(
+                        statement.where(User.id == user_id))).rowcount:
+                    user = await session.get(User, user_id,
+                                             populate_existing=True)
+            await session.commit()
+        return user
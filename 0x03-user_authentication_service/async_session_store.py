@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Async session store module: the session stores for coroutines.
+
+The SQL store runs on the async engine of AsyncDB, like the users
+table; the memory and file stores keep their blocking implementation
+and run in a pool of threads of their own.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Optional, Union
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from session_store import Session, SessionStore, _slide, get_session_store
+from user import UserSession
+
+
+class AsyncSqlSessionStore:
+    """Sessions in the sessions table, through an async engine
+    (see SqlSessionStore).
+
+    Every lookup reads the table: the session cache (see
+    CachedSessionStore) serves the blocking stores.
+    """
+
+    def __init__(self, engine: AsyncEngine, ttl: float) -> None:
+        """Initialize a store in the database of engine.
+        """
+        self.ttl = ttl
+        self._engine = engine
+        self._table = UserSession.__table__
+
+    async def create(self, user_id: int) -> str:
+        """Opens a new session for a user (see SessionStore.create).
+        """
+        session_id = str(uuid4())
+        async with self._engine.begin() as conn:
+            await conn.execute(insert(self._table).values(
+                id=session_id, user_id=user_id,
+                expires_at=time.time() + self.ttl))
+        return session_id
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        """Finds a live session and slides its expiry
+        (see SessionStore.get).
+        """
+        table = self._table
+        async with self._engine.connect() as conn:
+            row = (await conn.execute(
+                select(table.c.user_id, table.c.expires_at)
+                .where(table.c.id == session_id))).first()
+        session, slid = _slide(Session(*row) if row is not None else None,
+                               self.ttl)
+        if slid:
+            async with self._engine.begin() as conn:
+                await conn.execute(update(table)
+                                   .where(table.c.id == session_id)
+                                   .values(expires_at=session.expires_at))
+        return session
+
+    async def delete(self, session_id: str) -> None:
+        """Ends a session.
+        """
+        async with self._engine.begin() as conn:
+            await conn.execute(delete(self._table)
+                               .where(self._table.c.id == session_id))
+
+    async def delete_user(self, user_id: int) -> None:
+        """Ends every session of a user.
+        """
+        async with self._engine.begin() as conn:
+            await conn.execute(delete(self._table)
+                               .where(self._table.c.user_id == user_id))
+
+    async def sweep(self, batch_size: int = 500) -> int:
+        """Deletes up to batch_size expired sessions.
+        """
+        table = self._table
+        now = time.time()
+        async with self._engine.begin() as conn:
+            ids = (await conn.execute(
+                select(table.c.id).where(table.c.expires_at <= now)
+                .limit(batch_size))).scalars().all()
+            if ids:
+                await conn.execute(delete(table).where(
+                    table.c.id.in_(ids), table.c.expires_at <= now))
+        return len(ids)
+
+    async def close(self) -> None:
+        """Nothing to release: the engine belongs to AsyncDB.
+        """
+
+
+class ThreadedSessionStore:
+    """A blocking session store driven from coroutines, in a bounded
+    pool of threads so that slow file locks never take the loop's
+    default executor.
+    """
+
+    def __init__(self, store: SessionStore, workers: int) -> None:
+        """Initialize the async front of store.
+
+        Args:
+            store (SessionStore): The blocking store.
+            workers (int): Threads running its calls.
+        """
+        self.store = store
+        self.ttl = store.ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix="sessions")
+
+    async def _call(self, method: str, *args: Any) -> Any:
+        """Runs a method of the store in the pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, partial(getattr(self.store, method), *args))
+
+    async def create(self, user_id: int) -> str:
+        """Opens a new session for a user.
+        """
+        return await self._call("create", user_id)
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        """Finds a live session and slides its expiry.
+        """
+        return await self._call("get", session_id)
+
+    async def delete(self, session_id: str) -> None:
+        """Ends a session.
+        """
+        await self._call("delete", session_id)
+
+    async def delete_user(self, user_id: int) -> None:
+        """Ends every session of a user.
+        """
+        await self._call("delete_user", user_id)
+
+    async def sweep(self, batch_size: int = 500) -> int:
+        """Deletes up to batch_size expired sessions.
+        """
+        return await self._call("sweep", batch_size)
+
+    async def close(self) -> None:
+        """Stops the threads once their calls are done.
+        """
+        self._pool.shutdown(wait=False)
+
+
+def get_async_session_store(
+        engine: AsyncEngine
+) -> Union[AsyncSqlSessionStore, ThreadedSessionStore]:
+    """Builds the session store configured by the environment (see
+    get_session_store) for coroutines.
+
+    "sql" runs on engine; the other stores run in a pool of
+    SESSION_WORKERS threads (default 4).
+
+    Args:
+        engine (AsyncEngine): The engine of the service database.
+    """
+    backend = os.getenv("SESSION_STORE", "sql")
+    if backend == "sql":
+        return AsyncSqlSessionStore(
+            engine, float(os.getenv("SESSION_TTL", "86400")))
+    return ThreadedSessionStore(get_session_store(None),
+                                int(os.getenv("SESSION_WORKERS", "4")))
+
+
+async def sweep_forever(
+        store: Union[AsyncSqlSessionStore, ThreadedSessionStore]) -> None:
+    """Deletes expired sessions in batches until cancelled, as a
+    SessionSweeper does, configured by SESSION_SWEEP_INTERVAL and
+    SESSION_SWEEP_BATCH (see start_sweeper).
+    """
+    interval = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+    batch_size = int(os.getenv("SESSION_SWEEP_BATCH", "500"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            while await store.sweep(batch_size) == batch_size:
+                pass
+        except Exception:
+            # Retried at the next interval
+            pass
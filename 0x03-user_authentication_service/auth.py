@@ -4,13 +4,14 @@ Auth module
 """
 
 import logging
-from typing import Union
-from uuid import uuid4
+from typing import Optional, Union
+from uuid import UUID, uuid4
 
 import bcrypt
 from sqlalchemy.orm.exc import NoResultFound
 
 from db import DB
+from session_store import get_session_store, start_sweeper
 from user import User
 
 logging.disable(logging.WARNING)
@@ -37,12 +38,34 @@ def _generate_uuid() -> str:
     return str(uuid4())
 
 
+def _is_token(token: str) -> bool:
+    """Checks that a token has the form of the tokens we issue.
+
+    Args:
+        token (str): The token to check.
+
+    Returns:
+        bool: True if token is a UUID string.
+    """
+    try:
+        return str(UUID(token)) == token
+    except (TypeError, ValueError):
+        return False
+
+
 class Auth:
     """Auth class to interact with the authentication database.
     """
 
     def __init__(self):
         self._db = DB()
+        self._sessions = get_session_store(self._db._engine)
+        self._sweeper = start_sweeper(self._sessions)
+
+    def end_request(self) -> None:
+        """Releases the database session of the current thread.
+        """
+        self._db.remove_session()
 
     def register_user(self, email: str, password: str) -> User:
         """Registers a new user with the given email and password.
@@ -94,6 +117,9 @@ class Auth:
     def create_session(self, email: str) -> Union[str, None]:
         """Creates a session ID for the user with the given email.
 
+        The session is added to the session store; sessions the user
+        opened before stay valid.
+
         Args:
             email (str): The email of the user.
 
@@ -104,17 +130,10 @@ class Auth:
         try:
             # Retrieve the user by email
             user = self._db.find_user_by(email=email)
-
-            # Generate a new session ID
-            session_id = _generate_uuid()
-
-            # Update the user's session_id in the database
-            self._db.update_user(user.id, session_id=session_id)
-
-            # Return the session ID
-            return session_id
         except NoResultFound:
             return None
+        # Open a new session in the session store
+        return self._sessions.create(user.id)
 
     def get_user_from_session_id(self, session_id: str) -> Union[User, None]:
         """Finds and returns a user based on a session ID.
@@ -128,27 +147,28 @@ class Auth:
         if session_id is None:
             return None
 
-        try:
-            # Retrieve the user by session ID
-            user = self._db.find_user_by(session_id=session_id)
-            return user
-        except NoResultFound:
+        # Resolve the live session, then its user by primary key
+        session = self._sessions.get(session_id)
+        if session is None:
             return None
+        return self._db.get_user(session.user_id)
 
-    def destroy_session(self, user_id: int) -> None:
-        """Destroys the session ID for the user with the given user ID.
+    def destroy_session(self, user_id: int,
+                        session_id: Optional[str] = None) -> None:
+        """Destroys a session of the user with the given user ID.
 
         Args:
             user_id (int): The ID of the user.
+            session_id (str): The session to end; every session of the
+                user when None.
 
         Returns:
             None
         """
-        try:
-            # Update the user's session_id to None
-            self._db.update_user(user_id, session_id=None)
-        except NoResultFound:
-            pass
+        if session_id is None:
+            self._sessions.delete_user(user_id)
+        else:
+            self._sessions.delete(session_id)
 
     def get_reset_password_token(self, email: str) -> str:
         """Generates a reset password token for the user with the given email.
@@ -162,13 +182,12 @@ class Auth:
         Raises:
             ValueError: If the user does not exist.
         """
-        try:
-            user = self._db.find_user_by(email=email)
-            reset_token = _generate_uuid()
-            self._db.update_user(user.id, reset_token=reset_token)
-            return reset_token
-        except NoResultFound:
+        reset_token = _generate_uuid()
+        # Set the token on the user's row in one UPDATE ... WHERE email
+        if self._db.update_user_by({"email": email},
+                                   reset_token=reset_token) is None:
             raise ValueError("User does not exist")
+        return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
         """Updates a user's password using the reset token.
@@ -180,13 +199,21 @@ class Auth:
         Raises:
             ValueError: If the reset token is invalid.
         """
+        # Reject unknown tokens before paying for bcrypt; a missing
+        # token must not match users who have none
+        if not _is_token(reset_token):
+            raise ValueError("Invalid reset token")
         try:
-            user = self._db.find_user_by(reset_token=reset_token)
-            hashed_password = _hash_password(password)
-            self._db.update_user(
-                user.id,
-                hashed_password=hashed_password,
-                reset_token=None
-            )
+            self._db.find_user_by(reset_token=reset_token)
         except NoResultFound:
             raise ValueError("Invalid reset token")
+        hashed_password = _hash_password(password)
+        # Set the password and consume the token in one UPDATE ... WHERE,
+        # so a token can't be used twice
+        user = self._db.update_user_by(
+            {"reset_token": reset_token},
+            hashed_password=hashed_password,
+            reset_token=None
+        )
+        if user is None:
+            raise ValueError("Invalid reset token")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the Flask app against the ASGI app under mixed load.
+
+Each server is started in a scratch directory, then --logins threads
+keep logging in (bcrypt bound) while --profiles threads keep reading
+/profile, for --duration seconds. The point is how much slow logins
+delay profile reads: the report gives throughput, latency percentiles
+and error rates per operation and server, as JSON.
+
+The Flask app runs on Werkzeug's threaded server; the ASGI app on the
+command of --async-cmd (hypercorn by default).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from loadtest import session_cookie, summarize
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    "flask": [sys.executable, "-c",
+              "from app import app; "
+              "app.run(host='127.0.0.1', port={port}, threaded=True)"],
+    "async": ["hypercorn", "async_app:app", "--bind", "127.0.0.1:{port}"],
+}
+
+
+def free_port() -> int:
+    """An unused local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen,
+                  timeout: float = 30) -> bool:
+    """Wait until the server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class Client:
+    """Keep-alive HTTP client of the server under test."""
+
+    def __init__(self, port: int) -> None:
+        """Initialize a client of the local server on port."""
+        self.port = port
+        self.conn = None
+
+    def request(self, method: str, path: str, form: Dict = None,
+                session_id: str = None) -> Tuple[int, Optional[str]]:
+        """Return the status code and session cookie of a request."""
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if session_id is not None:
+            headers["Cookie"] = f"session_id={session_id}"
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(
+                    "127.0.0.1", self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body, headers)
+                response = self.conn.getresponse()
+                response.read()
+                return (response.status,
+                        session_cookie(response.getheader("Set-Cookie")))
+            except (http.client.HTTPException, OSError):
+                # Reconnect once if the server closed the connection
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def hammer(port: int, op: str, users: List[Tuple[str, str, str]],
+           stop: threading.Event, samples: List, offset: int) -> None:
+    """Repeat one operation until stop is set."""
+    client = Client(port)
+    i = offset
+    while not stop.is_set():
+        email, password, session_id = users[i % len(users)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            if op == "login":
+                status, _ = client.request(
+                    "POST", "/sessions",
+                    {"email": email, "password": password})
+            else:
+                status, _ = client.request("GET", "/profile",
+                                           session_id=session_id)
+            ok = status == 200
+        except Exception:
+            ok = False
+        samples.append((time.perf_counter() - start, ok))
+
+
+def run(command: List[str], options: argparse.Namespace) -> dict:
+    """Benchmark one server and return its report."""
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=HERE)
+    with tempfile.TemporaryDirectory() as workdir:
+        log_path = os.path.join(workdir, "server.log")
+        try:
+            with open(log_path, "wb") as log:
+                process = subprocess.Popen(
+                    [arg.replace("{port}", str(port)) for arg in command],
+                    cwd=workdir, env=env, stdout=log, stderr=log)
+        except OSError as e:
+            return {"error": f"server did not start: {e}"}
+        try:
+            if not wait_for_port(port, process):
+                process.kill()
+                process.wait()
+                with open(log_path, "rb") as log:
+                    return {"error": "server did not start: " +
+                            log.read().decode(errors="replace")[-2000:]}
+
+            client = Client(port)
+            users = []
+            for i in range(options.users):
+                email, password = f"bench-{i}@example.com", f"pwd-{i}"
+                client.request("POST", "/users",
+                               {"email": email, "password": password})
+                _, session_id = client.request(
+                    "POST", "/sessions",
+                    {"email": email, "password": password})
+                users.append((email, password, session_id))
+
+            samples = {"login": [], "profile": []}
+            stop = threading.Event()
+            threads = [threading.Thread(target=hammer, args=(
+                           port, op, users, stop, samples[op], i))
+                       for op, count in (("login", options.logins),
+                                         ("profile", options.profiles))
+                       for i in range(count)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(options.duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            report = summarize(samples, time.perf_counter() - start)
+            report["server"] = " ".join(command)
+            return report
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def main(options: argparse.Namespace) -> dict:
+    """Benchmark the selected servers."""
+    servers = dict(SERVERS, **{"async": shlex.split(options.async_cmd)})
+    return {
+        "logins": options.logins,
+        "profiles": options.profiles,
+        "duration_s": options.duration,
+        "results": {name: run(servers[name], options)
+                    for name in options.only or servers},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=8,
+                        help="threads logging in")
+    parser.add_argument("--profiles", type=int, default=8,
+                        help="threads reading /profile")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds of load per server")
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--only", action="append", choices=list(SERVERS),
+                        help="benchmark only this server (repeatable)")
+    parser.add_argument("--async-cmd", default=shlex.join(SERVERS["async"]),
+                        help="command serving async_app, {port} is "
+                             "replaced by the port")
+    options = parser.parse_args()
+
+    json.dump(main(options), sys.stdout, indent=2)
+    sys.stdout.write("\n")
@@ -2,43 +2,128 @@
 """
 DB module
 """
-from sqlalchemy import create_engine
+import os
+from typing import Any, Dict, Union
+
+from sqlalchemy import Update, create_engine, event, select, update
+from sqlalchemy.engine import URL, Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 
 from user import Base, User
 
 
+def _database_url() -> URL:
+    """URL of the database: DB_URL, default sqlite:///a.db
+    """
+    return make_url(os.getenv("DB_URL", "sqlite:///a.db"))
+
+
+def _engine_options(url: URL) -> Dict[str, Any]:
+    """Pool settings of the engine of url
+
+    DB_POOL_SIZE (5), DB_MAX_OVERFLOW (10), DB_POOL_TIMEOUT (30 seconds)
+    and DB_POOL_PRE_PING (0/1); in-memory SQLite has no pool to size.
+    """
+    options = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "0") == "1"}
+    if url.get_backend_name() != "sqlite" or \
+            url.database not in (None, "", ":memory:"):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")))
+    return options
+
+
+def _configure_sqlite(engine: Engine) -> None:
+    """Open the SQLite connections of engine in WAL mode, so readers
+    don't block the writer, with a busy timeout of SQLITE_BUSY_TIMEOUT
+    milliseconds (5000) instead of failing at once when it is locked
+    """
+    busy_timeout = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Configure each new SQLite connection"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.close()
+
+
+def _create_engine() -> Engine:
+    """Create the engine configured by the environment
+    """
+    url = _database_url()
+    engine = create_engine(url, echo=False, **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        _configure_sqlite(engine)
+    return engine
+
+
+def _user_update(criteria: Dict[str, Any],
+                 kwargs: Dict[str, Any]) -> Union[Update, None]:
+    """UPDATE statement of the users matching criteria, None if a
+    criterion is None (see DB.update_user_by)
+
+    Raises:
+        ValueError: If a criterion or kwarg isn't a User column.
+    """
+    columns = User.__table__.columns.keys()
+    for key in list(criteria) + list(kwargs):
+        if key not in columns:
+            raise ValueError(f"Invalid attribute '{key}' for user")
+    if not criteria or not kwargs:
+        raise ValueError("Criteria and attributes are required")
+    if any(value is None for value in criteria.values()):
+        return None
+    return update(User).filter_by(**criteria).values(**kwargs)
+
+
 class DB:
     """DB class for interacting with the database
+
+    Each thread works with its own session; call remove_session once
+    the thread is done with it (at the end of each request).
     """
 
     def __init__(self) -> None:
         """Initialize a new DB instance
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
+        self._engine = _create_engine()
         Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
+        """
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """Close the session of the current thread, returning its
+        connection to the pool
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Add a user to the database
+
+        Raises:
+            ValueError: If the email is already registered.
         """
         new_user = User(email=email, hashed_password=hashed_password)
         self._session.add(new_user)
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            # Registered concurrently since the caller checked
+            self._session.rollback()
+            raise ValueError(f"User {email} already exists")
         return new_user
 
     def find_user_by(self, **kwargs) -> User:
@@ -52,13 +137,46 @@ class DB:
         except InvalidRequestError:
             raise InvalidRequestError("Invalid query arguments provided")
 
+    def get_user(self, user_id: int) -> Union[User, None]:
+        """Find a user by primary key, from the session's identity map
+        when already loaded
+        """
+        return self._session.get(User, user_id)
+
     def update_user(self, user_id: int, **kwargs) -> None:
         """Update a user's attributes based on user_id and kwargs
         """
-        user = self.find_user_by(id=user_id)
-        for key, value in kwargs.items():
-            if hasattr(user, key):
-                setattr(user, key, value)
-            else:
-                raise ValueError(f"Invalid attribute '{key}' for user")
-        self._session.commit()
+        if self.update_user_by({"id": user_id}, **kwargs) is None:
+            raise NoResultFound("No user found with the provided criteria")
+
+    def update_user_by(self, criteria: Dict[str, Any],
+                       **kwargs) -> Union[User, None]:
+        """Update the user matching criteria with kwargs in a single
+        UPDATE ... WHERE statement and commit
+
+        Criteria with a None value match nothing, rather than rows where
+        the column IS NULL. On databases without UPDATE ... RETURNING,
+        the row is looked up by the criteria first.
+
+        Returns:
+            The updated user, or None if no user matched.
+
+        Raises:
+            ValueError: If a criterion or kwarg isn't a User column.
+        """
+        statement = _user_update(criteria, kwargs)
+        if statement is None:
+            return None
+
+        session = self._session
+        if self._engine.dialect.update_returning:
+            user = session.scalars(statement.returning(User)).first()
+        else:
+            user_id = session.scalars(
+                select(User.id).filter_by(**criteria)).first()
+            user = None
+            if user_id is not None and session.execute(
+                    statement.where(User.id == user_id)).rowcount:
+                user = session.get(User, user_id, populate_existing=True)
+        session.commit()
+        return user
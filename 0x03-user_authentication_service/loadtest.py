@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Load test of the user authentication service.
+
+Virtual users go through register, login, profile, logout and reset
+password flows from concurrent clients, either in-process through
+Flask's test client (default, on a scratch database in a temporary
+directory) or against a running server (--url). Throughput, latency
+percentiles and error rates are printed as JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+
+OPERATIONS = ("register", "login", "profile", "logout",
+              "reset_token", "update_password")
+
+# Weights of the actions open to a logged out / logged in user
+LOGGED_OUT_MIX = {"login": 4, "reset_token": 1}
+LOGGED_IN_MIX = {"profile": 8, "logout": 1}
+
+
+def session_cookie(set_cookie: Optional[str]) -> Optional[str]:
+    """Extract the session_id value of a Set-Cookie header."""
+    if not set_cookie:
+        return None
+    cookie = SimpleCookie()
+    cookie.load(set_cookie)
+    morsel = cookie.get("session_id")
+    return morsel.value if morsel else None
+
+
+class HttpClient:
+    """Client of a running server; cookies are handled by the caller."""
+
+    def __init__(self, url: str) -> None:
+        """Initialize a client of url."""
+        import requests
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(
+            allowed_domains=[]))
+
+    def request(self, method: str, path: str,
+                **kwargs) -> Tuple[int, Optional[dict], Optional[str]]:
+        """Return the status code, JSON body and session cookie."""
+        response = self.session.request(method, self.url + path,
+                                        allow_redirects=False, **kwargs)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return (response.status_code, body,
+                session_cookie(response.headers.get("Set-Cookie")))
+
+
+class TestClient:
+    """Client of the in-process app; cookies are handled by the caller."""
+
+    def __init__(self, app) -> None:
+        """Initialize a client of app."""
+        self.client = app.test_client(use_cookies=False)
+
+    def request(self, method: str, path: str,
+                **kwargs) -> Tuple[int, Optional[dict], Optional[str]]:
+        """Return the status code, JSON body and session cookie."""
+        response = self.client.open(path, method=method, **kwargs)
+        return (response.status_code, response.get_json(silent=True),
+                session_cookie(response.headers.get("Set-Cookie")))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = int(round(pct / 100 * len(values))) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+def summarize(samples: Dict[str, List], elapsed: float) -> dict:
+    """Throughput, latency percentiles (ms) and error rate per operation."""
+    def stats(entries):
+        latencies = sorted(latency for latency, _ in entries)
+        errors = sum(1 for _, ok in entries if not ok)
+        return {"requests": len(entries),
+                "throughput": len(entries) / elapsed if elapsed else 0.0,
+                "error_rate": errors / len(entries) if entries else 0.0,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p90_ms": percentile(latencies, 90) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "max_ms": (latencies[-1] if latencies else 0.0) * 1000}
+
+    everything = [entry for entries in samples.values() for entry in entries]
+    return {"elapsed_s": elapsed,
+            "total": stats(everything),
+            "operations": {op: stats(entries)
+                           for op, entries in samples.items() if entries}}
+
+
+class VirtualUser:
+    """Account driven by a worker."""
+
+    def __init__(self, email: str, password: str) -> None:
+        """Initialize an unregistered account."""
+        self.email = email
+        self.password = password
+        self.registered = False
+        self.session_id = None
+
+
+class Worker(threading.Thread):
+    """Client thread cycling through its virtual users."""
+
+    def __init__(self, client, number: int, accounts: int,
+                 requests: int, seed: int) -> None:
+        """Initialize a worker sending requests requests."""
+        super().__init__(daemon=True)
+        self.client = client
+        self.requests = requests
+        self.rng = random.Random(seed)
+        self.users = [VirtualUser("load-{}-{}-{}@example.com".format(
+                                      seed, number, i),
+                                  "pwd-{}".format(i))
+                      for i in range(accounts)]
+        self.samples = {op: [] for op in OPERATIONS}
+
+    def timed(self, op: str, method: str, path: str, expected: tuple,
+              **kwargs) -> Tuple[bool, Optional[dict], Optional[str]]:
+        """Issue one request and record its latency."""
+        start = time.perf_counter()
+        try:
+            status, body, cookie = self.client.request(method, path,
+                                                       **kwargs)
+            ok = status in expected
+        except Exception:
+            ok, body, cookie = False, None, None
+        self.samples[op].append((time.perf_counter() - start, ok))
+        return ok, body, cookie
+
+    def step(self, user: VirtualUser) -> None:
+        """Move user one action forward in its flow."""
+        if not user.registered:
+            user.registered, _, _ = self.timed(
+                "register", "POST", "/users", (200,),
+                data={"email": user.email, "password": user.password})
+            return
+
+        cookies = {"Cookie": "session_id={}".format(user.session_id)}
+        mix = LOGGED_IN_MIX if user.session_id else LOGGED_OUT_MIX
+        action = self.rng.choices(list(mix), list(mix.values()))[0]
+        if action == "login":
+            ok, _, session_id = self.timed(
+                "login", "POST", "/sessions", (200,),
+                data={"email": user.email, "password": user.password})
+            if ok:
+                user.session_id = session_id
+        elif action == "profile":
+            self.timed("profile", "GET", "/profile", (200,),
+                       headers=cookies)
+        elif action == "logout":
+            self.timed("logout", "DELETE", "/sessions", (200, 302),
+                       headers=cookies)
+            user.session_id = None
+        else:
+            ok, body, _ = self.timed(
+                "reset_token", "POST", "/reset_password", (200,),
+                data={"email": user.email})
+            if not ok or not body:
+                return
+            new_password = "pwd-{}".format(self.rng.random())
+            ok, _, _ = self.timed(
+                "update_password", "PUT", "/reset_password", (200,),
+                data={"email": user.email,
+                      "reset_token": body.get("reset_token"),
+                      "new_password": new_password})
+            if ok:
+                user.password = new_password
+
+    def run(self) -> None:
+        """Send the requests."""
+        while sum(map(len, self.samples.values())) < self.requests:
+            self.step(self.rng.choice(self.users))
+
+
+def main(options: argparse.Namespace) -> dict:
+    """Run the load test and return the report."""
+    if options.url:
+        def make_client():
+            return HttpClient(options.url)
+    else:
+        os.chdir(tempfile.mkdtemp())
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from app import app
+
+        def make_client():
+            return TestClient(app)
+
+    seed = options.seed if options.seed is not None else int(time.time())
+    per_worker = options.requests // options.concurrency
+    workers = [Worker(make_client(), i, options.accounts, per_worker,
+                      seed + i)
+               for i in range(options.concurrency)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    samples = {op: [] for op in OPERATIONS}
+    for worker in workers:
+        for op, entries in worker.samples.items():
+            samples[op].extend(entries)
+    report = summarize(samples, elapsed)
+    report["concurrency"] = options.concurrency
+    report["seed"] = seed
+    report["target"] = options.url or "test_client"
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=None,
+                        help="base URL of a running server, e.g. "
+                             "http://localhost:5000 (default: in-process)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="total number of requests")
+    parser.add_argument("--accounts", type=int, default=5,
+                        help="virtual users per worker")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the traffic mix; emails derive from "
+                             "it, so reuse one only on a fresh database")
+    options = parser.parse_args()
+
+    json.dump(main(options), sys.stdout, indent=2)
+    sys.stdout.write("\n")
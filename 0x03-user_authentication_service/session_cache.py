@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Session cache module: session ID to user ID lookups kept out of the DB.
+"""
+
+import dbm
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class SessionCache:
+    """In-process LRU cache of session ID -> user ID and session expiry,
+    with a TTL.
+
+    Each worker has its own cache, so a session ended by another worker
+    stays cached here for up to ttl seconds, hence a short default TTL
+    (see get_session_cache). DbmSessionCache shares invalidations
+    between the workers of a host.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            maxsize (int): Maximum number of sessions kept.
+            ttl (float): Seconds an entry stays valid.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._sessions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str) -> Optional[Tuple[int, float]]:
+        """Returns the user ID and expiry time of a session, None if
+        unknown or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[2] < time.monotonic():
+                self._drop(session_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, session_id: str, user_id: int, expires_at: float) -> None:
+        """Caches the user ID and expiry of a session.
+
+        Args:
+            session_id (str): The session ID.
+            user_id (int): The ID of its user.
+            expires_at (float): Expiry time of the session (epoch
+                seconds), which the entry never outlives.
+        """
+        ttl = min(self.ttl, expires_at - time.time())
+        with self._lock:
+            self._drop(session_id)
+            self._entries[session_id] = (user_id, expires_at,
+                                         time.monotonic() + ttl)
+            self._sessions.setdefault(user_id, set()).add(session_id)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, session_id: str) -> None:
+        """Forgets a session.
+        """
+        with self._lock:
+            self._drop(session_id)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forgets every session of a user.
+        """
+        with self._lock:
+            for session_id in list(self._sessions.get(user_id, ())):
+                self._drop(session_id)
+
+    def clear(self) -> None:
+        """Forgets every session.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._sessions.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the size and hit/miss counters of the cache.
+        """
+        with self._lock:
+            return {"size": len(self._entries),
+                    "hits": self.hits, "misses": self.misses}
+
+    def _drop(self, session_id: Optional[str]) -> None:
+        """Removes a session (lock must be held).
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return
+        sessions = self._sessions[entry[0]]
+        sessions.discard(session_id)
+        if not sessions:
+            del self._sessions[entry[0]]
+
+
+class DbmSessionCache:
+    """Session cache in a dbm file shared by the workers of one host.
+
+    Every operation holds an exclusive flock on <path>.lock, so workers
+    never lose each other's writes to the file. Lookups that fail fall
+    back to the session store; failed invalidations raise, since the
+    session would otherwise stay cached. Expired entries are purged, and
+    the file rewritten, at most once per ttl by each worker's puts.
+    """
+
+    def __init__(self, path: str, ttl: float = 30) -> None:
+        """Initialize a cache stored at path.
+
+        Args:
+            path (str): The dbm file (created when needed).
+            ttl (float): Seconds an entry stays valid.
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str) -> Optional[Tuple[int, float]]:
+        """Returns the user ID and expiry time of a session, None if
+        unknown or expired.
+        """
+        try:
+            with self._open() as db:
+                value = db.get(f"s:{session_id}")
+        except dbm.error:
+            value = None
+        if value is not None:
+            # user ID|entry expiry|session expiry; entries written before
+            # the session expiry was kept only have the entry's, earlier
+            fields = value.decode().split("|")
+            if float(fields[1]) >= time.time():
+                self.hits += 1
+                return int(fields[0]), float(fields[-1])
+        self.misses += 1
+        return None
+
+    def put(self, session_id: str, user_id: int, expires_at: float) -> None:
+        """Caches the user ID and expiry of a session (see
+        SessionCache.put).
+        """
+        expiry = min(time.time() + self.ttl, expires_at)
+        try:
+            with self._open() as db:
+                sessions = split_ids(db.get(f"u:{user_id}"))
+                sessions.add(session_id)
+                db[f"u:{user_id}"] = " ".join(sessions)
+                db[f"s:{session_id}"] = f"{user_id}|{expiry}|{expires_at}"
+            if time.monotonic() >= self._next_sweep:
+                self.sweep()
+        except dbm.error:
+            # Not caching a session only costs a lookup in the store
+            pass
+
+    def invalidate(self, session_id: str) -> None:
+        """Forgets a session.
+
+        Raises:
+            dbm.error: If the file could not be updated.
+        """
+        with self._open() as db:
+            value = db.get(f"s:{session_id}")
+            if value is None:
+                return
+            delete_key(db, f"s:{session_id}")
+            user_key = "u:" + value.decode().split("|")[0]
+            sessions = split_ids(db.get(user_key))
+            sessions.discard(session_id)
+            if sessions:
+                db[user_key] = " ".join(sessions)
+            else:
+                delete_key(db, user_key)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forgets every session of a user.
+
+        Raises:
+            dbm.error: If the file could not be updated.
+        """
+        with self._open() as db:
+            for session_id in split_ids(db.get(f"u:{user_id}")):
+                delete_key(db, f"s:{session_id}")
+            delete_key(db, f"u:{user_id}")
+
+    def sweep(self) -> int:
+        """Purges the expired entries, rewriting the file so that its
+        size follows the live entries (dbm files don't shrink on delete).
+
+        Returns:
+            int: The number of entries purged.
+        """
+        self._next_sweep = time.monotonic() + self.ttl
+        now = time.time()
+        opener = self._open()
+        with opener as db:
+            live = {}
+            expired = 0
+            for key in db.keys():
+                if not key.startswith(b"s:"):
+                    continue
+                value = db[key]
+                if float(value.decode().split("|")[1]) < now:
+                    expired += 1
+                else:
+                    live[key] = value
+            if expired:
+                db = opener.recreate()
+                sessions = {}
+                for key, value in live.items():
+                    db[key] = value
+                    user_key = b"u:" + value.split(b"|")[0]
+                    sessions.setdefault(user_key, []).append(key[2:])
+                for user_key, session_ids in sessions.items():
+                    db[user_key] = b" ".join(session_ids)
+        return expired
+
+    def clear(self) -> None:
+        """Forgets every session.
+        """
+        with self._open("n"):
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters of this process.
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _open(self, flag: str = "c") -> "LockedDbm":
+        """Opens the file under the lock.
+        """
+        return LockedDbm(self.path, flag, self._lock)
+
+
+class LockedDbm:
+    """Context manager opening a dbm file under thread and file locks.
+    """
+
+    def __init__(self, path: str, flag: str, lock: threading.Lock) -> None:
+        """Initialize the opener of the dbm file at path.
+        """
+        self._path = path
+        self._flag = flag
+        self._lock = lock
+        self._lock_file = None
+        self._db = None
+
+    def __enter__(self):
+        """Takes the locks and opens the file.
+        """
+        self._lock.acquire()
+        try:
+            if fcntl is not None:
+                self._lock_file = open(self._path + ".lock", "a")
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._db = dbm.open(self._path, self._flag)
+        except BaseException:
+            self.__exit__()
+            raise
+        return self._db
+
+    def __exit__(self, *exc_info) -> None:
+        """Closes the file and releases the locks.
+        """
+        try:
+            if self._db is not None:
+                self._db.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+        finally:
+            self._db = self._lock_file = None
+            self._lock.release()
+
+    def recreate(self):
+        """Replaces the open file with an empty one, keeping the locks.
+        """
+        self._db.close()
+        self._db = None
+        self._db = dbm.open(self._path, "n")
+        return self._db
+
+
+def split_ids(value: Optional[bytes]) -> Set[str]:
+    """Session IDs of a space separated dbm value.
+    """
+    return set(value.decode().split()) if value else set()
+
+
+def delete_key(db, key: Union[str, bytes]) -> None:
+    """Deletes a key of a dbm file if present.
+    """
+    try:
+        del db[key]
+    except KeyError:
+        pass
+
+
+def get_session_cache() -> Union[SessionCache, DbmSessionCache, None]:
+    """Builds the session cache configured by the environment.
+
+    SESSION_CACHE is "memory" (default), "dbm:<path>" or "none";
+    SESSION_CACHE_SIZE and SESSION_CACHE_TTL size the cache. The TTL
+    defaults to 30 seconds for "dbm" and to 5 for "memory", which bounds
+    how long a logout on another worker goes unnoticed.
+
+    Returns:
+        The session cache, or None when disabled.
+    """
+    backend = os.getenv("SESSION_CACHE", "memory")
+    if backend == "none":
+        return None
+    if backend.startswith("dbm:"):
+        return DbmSessionCache(backend[len("dbm:"):],
+                               float(os.getenv("SESSION_CACHE_TTL", "30")))
+    return SessionCache(int(os.getenv("SESSION_CACHE_SIZE", "10000")),
+                        float(os.getenv("SESSION_CACHE_TTL", "5")))
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Session store module: login sessions kept apart from the users table.
+
+A user may hold several sessions. Each expires ttl seconds after its
+last use (sliding expiry); to keep reads cheap, the expiry is only
+pushed back once half of the TTL has elapsed. Expired sessions are
+refused on lookup and deleted in batches by a SessionSweeper.
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from typing import NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Engine
+
+from session_cache import (LockedDbm, delete_key, get_session_cache,
+                           split_ids)
+from user import UserSession
+
+
+class Session(NamedTuple):
+    """A live session: its user and expiry time (epoch seconds).
+    """
+    user_id: int
+    expires_at: float
+
+
+class SessionStore(ABC):
+    """Interface of the session stores.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        """Initialize a store of sessions lasting ttl seconds.
+        """
+        self.ttl = ttl
+
+    def create(self, user_id: int) -> str:
+        """Opens a new session for a user.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            str: The session ID.
+        """
+        session_id = str(uuid4())
+        self._put(session_id, Session(user_id, time.time() + self.ttl))
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Finds a live session and slides its expiry.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            Session: The session, or None if unknown or expired.
+        """
+        session, slid = _slide(self._get(session_id), self.ttl)
+        if slid:
+            self._touch(session_id, session.expires_at)
+        return session
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Ends a session.
+        """
+
+    @abstractmethod
+    def delete_user(self, user_id: int) -> None:
+        """Ends every session of a user.
+        """
+
+    @abstractmethod
+    def sweep(self, batch_size: int = 500) -> int:
+        """Deletes up to batch_size expired sessions.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+
+    @abstractmethod
+    def _put(self, session_id: str, session: Session) -> None:
+        """Stores a new session.
+        """
+
+    @abstractmethod
+    def _get(self, session_id: str) -> Optional[Session]:
+        """Returns a stored session, expired or not.
+        """
+
+    @abstractmethod
+    def _touch(self, session_id: str, expires_at: float) -> None:
+        """Pushes back the expiry of a session.
+        """
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions held in memory by the current process.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        """Initialize an empty store.
+        """
+        super().__init__(ttl)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._by_user = {}
+
+    def delete(self, session_id: str) -> None:
+        """Ends a session.
+        """
+        with self._lock:
+            self._drop(session_id)
+
+    def delete_user(self, user_id: int) -> None:
+        """Ends every session of a user.
+        """
+        with self._lock:
+            for session_id in list(self._by_user.get(user_id, ())):
+                self._drop(session_id)
+
+    def sweep(self, batch_size: int = 500) -> int:
+        """Deletes up to batch_size expired sessions.
+        """
+        now = time.time()
+        # Scan a copy so the lock is only held to delete
+        with self._lock:
+            items = list(self._sessions.items())
+        expired = [session_id for session_id, session in items
+                   if session.expires_at <= now][:batch_size]
+        with self._lock:
+            for session_id in expired:
+                session = self._sessions.get(session_id)
+                if session is not None and session.expires_at <= now:
+                    self._drop(session_id)
+        return len(expired)
+
+    def _put(self, session_id: str, session: Session) -> None:
+        """Stores a new session.
+        """
+        with self._lock:
+            self._sessions[session_id] = session
+            self._by_user.setdefault(session.user_id, set()).add(session_id)
+
+    def _get(self, session_id: str) -> Optional[Session]:
+        """Returns a stored session, expired or not.
+        """
+        return self._sessions.get(session_id)
+
+    def _touch(self, session_id: str, expires_at: float) -> None:
+        """Pushes back the expiry of a session.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions[session_id] = Session(session.user_id,
+                                                     expires_at)
+
+    def _drop(self, session_id: str) -> None:
+        """Removes a session (lock must be held).
+        """
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        sessions = self._by_user[session.user_id]
+        sessions.discard(session_id)
+        if not sessions:
+            del self._by_user[session.user_id]
+
+
+class SqlSessionStore(SessionStore):
+    """Sessions in the sessions table of the service database.
+
+    Runs single statements on short-lived connections of its own, so
+    logins and logouts never wait on the users table or on the ORM
+    session serving profile reads.
+    """
+
+    def __init__(self, engine: Engine, ttl: float) -> None:
+        """Initialize a store in the database of engine.
+        """
+        super().__init__(ttl)
+        self._engine = engine
+        self._table = UserSession.__table__
+
+    def delete(self, session_id: str) -> None:
+        """Ends a session.
+        """
+        with self._engine.begin() as conn:
+            conn.execute(delete(self._table)
+                         .where(self._table.c.id == session_id))
+
+    def delete_user(self, user_id: int) -> None:
+        """Ends every session of a user.
+        """
+        with self._engine.begin() as conn:
+            conn.execute(delete(self._table)
+                         .where(self._table.c.user_id == user_id))
+
+    def sweep(self, batch_size: int = 500) -> int:
+        """Deletes up to batch_size expired sessions.
+        """
+        table = self._table
+        now = time.time()
+        with self._engine.begin() as conn:
+            ids = conn.execute(select(table.c.id)
+                               .where(table.c.expires_at <= now)
+                               .limit(batch_size)).scalars().all()
+            if ids:
+                conn.execute(delete(table).where(table.c.id.in_(ids),
+                                                 table.c.expires_at <= now))
+        return len(ids)
+
+    def _put(self, session_id: str, session: Session) -> None:
+        """Stores a new session.
+        """
+        with self._engine.begin() as conn:
+            conn.execute(insert(self._table).values(
+                id=session_id, user_id=session.user_id,
+                expires_at=session.expires_at))
+
+    def _get(self, session_id: str) -> Optional[Session]:
+        """Returns a stored session, expired or not.
+        """
+        table = self._table
+        with self._engine.connect() as conn:
+            row = conn.execute(select(table.c.user_id, table.c.expires_at)
+                               .where(table.c.id == session_id)).first()
+        return Session(*row) if row is not None else None
+
+    def _touch(self, session_id: str, expires_at: float) -> None:
+        """Pushes back the expiry of a session.
+        """
+        with self._engine.begin() as conn:
+            conn.execute(update(self._table)
+                         .where(self._table.c.id == session_id)
+                         .values(expires_at=expires_at))
+
+
+class FileSessionStore(SessionStore):
+    """Sessions in a dbm file, shared by the workers of one host.
+
+    Every operation opens the file under an exclusive lock on
+    <path>.lock, since dbm files allow a single writer.
+    """
+
+    def __init__(self, path: str, ttl: float) -> None:
+        """Initialize a store in the dbm file at path.
+        """
+        super().__init__(ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        # Start empty, like the users table which DB recreates
+        with self._open("n"):
+            pass
+
+    def delete(self, session_id: str) -> None:
+        """Ends a session.
+        """
+        with self._open() as db:
+            self._drop(db, session_id)
+
+    def delete_user(self, user_id: int) -> None:
+        """Ends every session of a user.
+        """
+        with self._open() as db:
+            for session_id in split_ids(db.get(f"u:{user_id}")):
+                self._drop(db, session_id)
+
+    def sweep(self, batch_size: int = 500) -> int:
+        """Deletes up to batch_size expired sessions.
+        """
+        now = time.time()
+        expired = 0
+        with self._open() as db:
+            for key in db.keys():
+                if expired == batch_size:
+                    break
+                if not key.startswith(b"s:"):
+                    continue
+                session = _decode(db.get(key))
+                if session is not None and session.expires_at <= now:
+                    self._drop(db, key[2:].decode())
+                    expired += 1
+        return expired
+
+    def _put(self, session_id: str, session: Session) -> None:
+        """Stores a new session.
+        """
+        with self._open() as db:
+            user_key = f"u:{session.user_id}"
+            sessions = split_ids(db.get(user_key)) | {session_id}
+            db[user_key] = " ".join(sessions)
+            db[f"s:{session_id}"] = _encode(session)
+
+    def _get(self, session_id: str) -> Optional[Session]:
+        """Returns a stored session, expired or not.
+        """
+        with self._open() as db:
+            return _decode(db.get(f"s:{session_id}"))
+
+    def _touch(self, session_id: str, expires_at: float) -> None:
+        """Pushes back the expiry of a session.
+        """
+        with self._open() as db:
+            session = _decode(db.get(f"s:{session_id}"))
+            if session is not None:
+                db[f"s:{session_id}"] = _encode(
+                    Session(session.user_id, expires_at))
+
+    def _open(self, flag: str = "c") -> "LockedDbm":
+        """Opens the file under the lock.
+        """
+        return LockedDbm(self.path, flag, self._lock)
+
+    @staticmethod
+    def _drop(db, session_id: str) -> None:
+        """Removes a session from an open file.
+        """
+        session = _decode(db.get(f"s:{session_id}"))
+        if session is None:
+            return
+        delete_key(db, f"s:{session_id}")
+        user_key = f"u:{session.user_id}"
+        sessions = split_ids(db.get(user_key)) - {session_id}
+        if sessions:
+            db[user_key] = " ".join(sessions)
+        else:
+            delete_key(db, user_key)
+
+
+def _slide(session: Optional[Session],
+           ttl: float) -> Tuple[Optional[Session], bool]:
+    """Applies sliding expiry to a stored session.
+
+    Returns:
+        The session, None if missing or expired, and whether its expiry
+        was pushed back (and must be saved).
+    """
+    if session is None:
+        return None, False
+    now = time.time()
+    if session.expires_at <= now:
+        return None, False
+    if session.expires_at - now < ttl / 2:
+        return Session(session.user_id, now + ttl), True
+    return session, False
+
+
+def _encode(session: Session) -> str:
+    """dbm value of a session.
+    """
+    return f"{session.user_id}|{session.expires_at}"
+
+
+def _decode(value: Optional[bytes]) -> Optional[Session]:
+    """Session of a dbm value.
+    """
+    if value is None:
+        return None
+    user_id, expires_at = value.decode().split("|")
+    return Session(int(user_id), float(expires_at))
+
+
+class CachedSessionStore(SessionStore):
+    """Session store answering lookups from a session cache first.
+    """
+
+    def __init__(self, store: SessionStore, cache) -> None:
+        """Initialize a cache in front of store.
+        """
+        super().__init__(store.ttl)
+        self.store = store
+        self.cache = cache
+
+    def create(self, user_id: int) -> str:
+        """Opens a new session for a user.
+        """
+        session_id = self.store.create(user_id)
+        self.cache.put(session_id, user_id, time.time() + self.ttl)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Finds a live session, from the cache when possible.
+
+        Hits never read the store: the cached expiry is slid, and saved
+        to both store and cache when pushed back. A cache private to
+        this process only learns of its own logouts, so one on another
+        worker is seen once the entry expires, at most a cache TTL later.
+        """
+        cached = self.cache.get(session_id)
+        if cached is None:
+            session = self.store.get(session_id)
+            if session is not None:
+                self.cache.put(session_id, *session)
+            return session
+        session, slid = _slide(Session(*cached), self.ttl)
+        if slid:
+            self.store._touch(session_id, session.expires_at)
+            self.cache.put(session_id, *session)
+        return session
+
+    def delete(self, session_id: str) -> None:
+        """Ends a session.
+        """
+        self.cache.invalidate(session_id)
+        self.store.delete(session_id)
+
+    def delete_user(self, user_id: int) -> None:
+        """Ends every session of a user.
+        """
+        self.cache.invalidate_user(user_id)
+        self.store.delete_user(user_id)
+
+    def sweep(self, batch_size: int = 500) -> int:
+        """Deletes up to batch_size expired sessions.
+        """
+        return self.store.sweep(batch_size)
+
+    def _put(self, session_id: str, session: Session) -> None:
+        """Stores a new session.
+        """
+        self.store._put(session_id, session)
+
+    def _get(self, session_id: str) -> Optional[Session]:
+        """Returns a stored session, expired or not.
+        """
+        return self.store._get(session_id)
+
+    def _touch(self, session_id: str, expires_at: float) -> None:
+        """Pushes back the expiry of a session.
+        """
+        self.store._touch(session_id, expires_at)
+
+
+class SessionSweeper(threading.Thread):
+    """Background thread deleting expired sessions in batches.
+    """
+
+    def __init__(self, store: SessionStore, interval: float = 60,
+                 batch_size: int = 500) -> None:
+        """Initialize a sweeper of store.
+
+        Args:
+            store (SessionStore): The store to sweep.
+            interval (float): Seconds between sweeps.
+            batch_size (int): Sessions deleted per statement/lock hold.
+        """
+        super().__init__(name="session-sweeper", daemon=True)
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+        self.swept = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        """Sweeps every interval until stopped.
+        """
+        while not self._stopped.wait(self.interval):
+            self.sweep()
+
+    def sweep(self) -> int:
+        """Deletes every expired session, one batch at a time.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        total = 0
+        while not self._stopped.is_set():
+            try:
+                swept = self.store.sweep(self.batch_size)
+            except Exception:
+                # Retried at the next interval
+                break
+            total += swept
+            if swept < self.batch_size:
+                break
+        self.swept += total
+        return total
+
+    def stop(self) -> None:
+        """Stops the thread after the current batch.
+        """
+        self._stopped.set()
+
+
+def get_session_store(engine: Engine) -> SessionStore:
+    """Builds the session store configured by the environment.
+
+    SESSION_STORE is "sql" (default, the sessions table of engine),
+    "memory" or "file:<path>"; sessions last SESSION_TTL seconds
+    (default one day) after their last use. Stores other than "memory"
+    get the session cache of get_session_cache in front.
+
+    Args:
+        engine (Engine): The engine of the service database.
+
+    Returns:
+        SessionStore: The session store.
+    """
+    backend = os.getenv("SESSION_STORE", "sql")
+    ttl = float(os.getenv("SESSION_TTL", "86400"))
+    if backend == "memory":
+        return MemorySessionStore(ttl)
+    if backend.startswith("file:"):
+        store = FileSessionStore(backend[len("file:"):], ttl)
+    else:
+        store = SqlSessionStore(engine, ttl)
+    cache = get_session_cache()
+    return CachedSessionStore(store, cache) if cache is not None else store
+
+
+def start_sweeper(store: SessionStore) -> SessionSweeper:
+    """Starts the sweeper of a store, configured by the environment.
+
+    SESSION_SWEEP_INTERVAL (seconds, default 60) and SESSION_SWEEP_BATCH
+    (default 500).
+    """
+    sweeper = SessionSweeper(
+        store, float(os.getenv("SESSION_SWEEP_INTERVAL", "60")),
+        int(os.getenv("SESSION_SWEEP_BATCH", "500")))
+    sweeper.start()
+    return sweeper
@@ -3,7 +3,8 @@
 User model definition
 """
 
-from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy import (Column, Float, ForeignKey, Integer, String,
+                        create_engine)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -16,10 +17,23 @@ class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
     session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    reset_token = Column(String(250), nullable=True, index=True)
+
+
+class UserSession(Base):
+    """
+    SQLAlchemy model for the sessions table: one row per live session,
+    a user may have several
+    """
+    __tablename__ = 'sessions'
+
+    id = Column(String(250), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False,
+                     index=True)
+    expires_at = Column(Float, nullable=False, index=True)
 
 
 # Code to create the table in the database